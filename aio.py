@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from models import Venue, Artist, primary_until
+from pool import engine_options
+from upcoming import refreshed_at_select, is_fresh
+from queries import (
+    venue_area_select, group_areas, artist_list_select,
+    venue_select, artist_select, genre_name_select, venue_show_select, artist_show_select,
+    detail_dict, show_query, show_page_rows,
+    show_validator_select, show_validator_values, list_validator_select, list_validator_values,
+    show_list_validator_select, show_list_validator_values,
+)
+#----------------------------------------------------------------------------#
+# Async engine.
+#----------------------------------------------------------------------------#
+
+# The read-only pages can also be served from asyncio (see asgi.py). They run
+# the same statements as queries.py on an async engine: asyncpg for Postgres,
+# aiosqlite for SQLite.
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_url(url):
+    # The async driver URL for a sync database URL.
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+def create_engine(config, url=None):
+    url = url or config.get('ASYNC_DATABASE_URI') or async_url(config['SQLALCHEMY_DATABASE_URI'])
+    return create_async_engine(url, **engine_options(config, url, asyncio=True))
+
+def create_replica_engines(config):
+    return [create_engine(config, async_url(url)) for url in config.get('SQLALCHEMY_REPLICA_URIS') or []]
+
+# The engines a request reads from: `read` is a replica, or the primary as in
+# models.RoutingSession, and `primary` refills the page cache.
+Engines = namedtuple('Engines', 'read primary')
+
+def request_engines(primary, replicas):
+    if not replicas or primary_until() >= time.time():
+        return Engines(primary, primary)
+    return Engines(random.choice(replicas), primary)
+
+async def fetch(engine, statement):
+    # Runs statement on a connection of its own, so independent statements
+    # can be awaited together.
+    async with engine.connect() as connection:
+        return (await connection.execute(statement)).all()
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# The views below take an Engines and the validators of queries.py run on
+# its read engine.
+
+async def venue_validators(engines, venue_id):
+    rows = await fetch(engines.read, show_validator_select(Venue, int(venue_id), datetime.now()))
+    return show_validator_values(rows[0] if rows else None)
+
+async def artist_validators(engines, artist_id):
+    rows = await fetch(engines.read, show_validator_select(Artist, int(artist_id), datetime.now()))
+    return show_validator_values(rows[0] if rows else None)
+
+async def list_validators(engines, model):
+    return list_validator_values((await fetch(engines.read, list_validator_select(model)))[0])
+
+async def show_list_validators(engines):
+    return show_list_validator_values((await fetch(engines.read, show_list_validator_select(datetime.now())))[0])
+
+async def venue_areas(engine, genres=None):
+    return group_areas(await fetch(engine, venue_area_select(genres)))
+
+async def artist_list(engine, genres=None):
+    return await fetch(engine, artist_list_select(genres))
+
+async def _detail(engine, model, select_record, select_shows, id):
+    # The record, its genres and its shows are fetched concurrently.
+    rows, genres, shows = await asyncio.gather(
+        fetch(engine, select_record(id)),
+        fetch(engine, genre_name_select(model, id)),
+        fetch(engine, select_shows(id)),
+    )
+    if not rows:
+        return None
+    return detail_dict(rows[0], [name for name, in genres], shows)
+
+async def venue_detail(engine, venue_id):
+    return await _detail(engine, Venue, venue_select, venue_show_select, venue_id)
+
+async def artist_detail(engine, artist_id):
+    return await _detail(engine, Artist, artist_select, artist_show_select, artist_id)
+
+async def use_read_model(engine, filters):
+    # upcoming.use_read_model without blocking the event loop
+    if not filters.get('upcoming'):
+        return False
+    rows = await fetch(engine, refreshed_at_select())
+    return is_fresh(rows[0][0] if rows else None)
+
+async def show_page(engine, limit, **filters):
+    read_model = await use_read_model(engine, filters)
+    return show_page_rows(await fetch(engine, show_query(read_model, **filters).limit(limit + 1)), limit)
@@ -0,0 +1,293 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from flask import Blueprint, abort, current_app, g, request
+from sqlalchemy import select
+from werkzeug.exceptions import HTTPException
+from models import db, Venue, Artist, Show, SHOW_DURATION, MAX_SHOW_DURATION
+from queries import genre_names, with_genres, filter_shows, encode_show_cursor
+from scheduling import conflicting, free_slots
+
+# Both optional: orjson serializes several times faster than json, brotli
+# compresses smaller than gzip.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+api = Blueprint('api', __name__)
+
+@api.before_request
+def read_from_replicas():
+    # the API is read-only, see models.read_only
+    g.read_only = True
+
+#----------------------------------------------------------------------------#
+# Fields.
+#----------------------------------------------------------------------------#
+
+# Each resource maps its field names to the column expressions selecting
+# them. ?fields=name,city returns only those fields and only their columns
+# are queried; without it every field is returned.
+
+VENUE_FIELDS = {
+    "id": Venue.id,
+    "name": Venue.name,
+    "genres": genre_names(Venue),
+    "address": Venue.address,
+    "city": Venue.city,
+    "state": Venue.state,
+    "phone": Venue.phone,
+    "website": Venue.website_link,
+    "facebook_link": Venue.facebook_link,
+    "seeking_talent": Venue.seeking_talent,
+    "seeking_description": Venue.seeking_description,
+    "image_link": Venue.image_link,
+    "num_upcoming_shows": Venue.upcoming_show_count,
+    "updated_at": Venue.updated_at,
+}
+
+ARTIST_FIELDS = {
+    "id": Artist.id,
+    "name": Artist.name,
+    "genres": genre_names(Artist),
+    "city": Artist.city,
+    "state": Artist.state,
+    "phone": Artist.phone,
+    "website": Artist.website_link,
+    "facebook_link": Artist.facebook_link,
+    "seeking_venue": Artist.seeking_venue,
+    "seeking_description": Artist.seeking_description,
+    "image_link": Artist.image_link,
+    "num_upcoming_shows": Artist.upcoming_show_count,
+    "updated_at": Artist.updated_at,
+}
+
+SHOW_FIELDS = {
+    "id": Show.id,
+    "start_time": Show.start_time,
+    "end_time": Show.end_time,
+    "venue_id": Show.venue_id,
+    "venue_name": Venue.name,
+    "venue_image_link": Venue.image_link,
+    "artist_id": Show.artist_id,
+    "artist_name": Artist.name,
+    "artist_image_link": Artist.image_link,
+    "updated_at": Show.updated_at,
+}
+
+def requested_fields(fields):
+    names = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    if not names:
+        return list(fields)
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        abort(400, 'unknown fields: {}'.format(', '.join(unknown)))
+    return names
+
+def select_fields(model, fields, names, *extra):
+    # A select of the named fields plus any extra columns, joining shows to
+    # their venue or artist only when one of its columns is asked for.
+    columns = [fields[name] for name in names] + list(extra)
+    query = select(*columns).select_from(model)
+    if model is Show:
+        for other, show_key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+            if any(getattr(column, 'class_', None) is other for column in columns):
+                query = query.join(other, show_key == other.id)
+    return query
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(value)
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_json_default, separators=(',', ':')).encode()
+
+def records(names, rows):
+    # Dicts built straight from result row tuples. Columns past the named
+    # ones (cursor keys) are left out.
+    data = [dict(zip(names, row)) for row in rows]
+    if "genres" in names:
+        for record in data:
+            record["genres"] = record["genres"].split(';') if record["genres"] else []
+    return data
+
+def json_response(payload, status=200):
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(HTTPException)
+def http_error(error):
+    # the app's own 404 and 500 handlers render HTML pages
+    response = json_response({"error": error.description}, error.code)
+    # e.g. Allow on a 405
+    for name, value in error.get_headers():
+        if name != 'Content-Type':
+            response.headers[name] = value
+    return response
+
+@api.after_request
+def compress(response):
+    # Compresses JSON bodies above API_COMPRESS_MIN_SIZE bytes with brotli
+    # or gzip, whichever the client prefers.
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length < current_app.config.get('API_COMPRESS_MIN_SIZE', 1024):
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding == 'br':
+        response.set_data(brotli.compress(response.get_data(), quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+# Lists return {"data": [...], "next": cursor}; pass the cursor back as
+# ?after= for the following page, which is the last one when next is null.
+
+def page_size():
+    limit = request.args.get('limit', current_app.config.get('API_PAGE_SIZE', 100), type=int)
+    return max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+
+def list_response(model, fields):
+    # Venues or artists in id order, optionally limited to any of ?genre=.
+    names = requested_fields(fields)
+    limit = page_size()
+    query = select_fields(model, fields, names, model.id.label('cursor_id'))
+    genres = request.args.getlist('genre')
+    if genres:
+        query = query.where(with_genres(model, genres))
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            query = query.where(model.id > int(after))
+        except ValueError:
+            abort(400, 'invalid cursor')
+    rows = db.session.execute(query.order_by(model.id).limit(limit + 1)).all()
+    next_cursor = str(rows[limit - 1][-1]) if len(rows) > limit else None
+    return json_response({"data": records(names, rows[:limit]), "next": next_cursor})
+
+def detail_response(model, fields, id):
+    names = requested_fields(fields)
+    row = db.session.execute(select_fields(model, fields, names).where(model.id == id)).first()
+    if row is None:
+        abort(404, 'no {} {}'.format(model.__tablename__.lower(), id))
+    return json_response({"data": records(names, [row])[0]})
+
+@api.route('/venues')
+def venues():
+    return list_response(Venue, VENUE_FIELDS)
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return detail_response(Venue, VENUE_FIELDS, venue_id)
+
+@api.route('/artists')
+def artists():
+    return list_response(Artist, ARTIST_FIELDS)
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return detail_response(Artist, ARTIST_FIELDS, artist_id)
+
+def _flag(value):
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+@api.route('/shows')
+def shows():
+    # Same filters and cursor as the /shows page.
+    names = requested_fields(SHOW_FIELDS)
+    limit = page_size()
+    query = select_fields(Show, SHOW_FIELDS, names, Show.start_time.label('cursor_start_time'), Show.id.label('cursor_id'))
+    try:
+        query = filter_shows(
+            query,
+            upcoming=request.args.get('upcoming', False, type=_flag),
+            start=request.args.get('from', type=datetime.fromisoformat),
+            end=request.args.get('to', type=datetime.fromisoformat),
+            venue_id=request.args.get('venue_id', type=int),
+            artist_id=request.args.get('artist_id', type=int),
+            after=request.args.get('after'),
+        )
+    except ValueError:
+        abort(400, 'invalid cursor')
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_show_cursor(rows[limit - 1][-2], rows[limit - 1][-1])
+    return json_response({"data": records(names, rows[:limit]), "next": next_cursor})
+
+@api.route('/shows/<int:show_id>')
+def show(show_id):
+    return detail_response(Show, SHOW_FIELDS, show_id)
+
+def _required(name, type):
+    value = request.args.get(name, type=type)
+    if value is None:
+        abort(400, 'missing or invalid {}'.format(name))
+    return value
+
+@api.route('/shows/conflicts')
+def show_conflicts():
+    # The shows a new booking of ?venue_id= and ?artist_id= from ?start= for
+    # ?duration= minutes (or until ?end=) would clash with; none means it fits.
+    venue_id = _required('venue_id', int)
+    artist_id = _required('artist_id', int)
+    start = _required('start', datetime.fromisoformat)
+    end = request.args.get('end', type=datetime.fromisoformat)
+    if end is None:
+        end = start + timedelta(minutes=request.args.get('duration', SHOW_DURATION // timedelta(minutes=1), type=int))
+    if end <= start:
+        abort(400, 'end must be after start')
+    if end - start > MAX_SHOW_DURATION:
+        abort(400, 'shows last at most {}'.format(MAX_SHOW_DURATION))
+    names = requested_fields(SHOW_FIELDS)
+    query = select_fields(Show, SHOW_FIELDS, names).where(conflicting(venue_id, artist_id, start, end))
+    rows = db.session.execute(query.order_by(Show.start_time, Show.id)).all()
+    return json_response({"data": records(names, rows), "conflict": bool(rows)})
+
+@api.route('/venues/<int:venue_id>/free-slots')
+def venue_free_slots(venue_id):
+    # Gaps of at least ?min_minutes= (default 60) between the venue's shows
+    # in the ISO ?week= (e.g. 2026-W42, default this week).
+    if db.session.scalar(select(Venue.id).where(Venue.id == venue_id)) is None:
+        abort(404, 'no venue {}'.format(venue_id))
+    try:
+        week = request.args.get('week') or datetime.now().strftime('%G-W%V')
+        start = datetime.strptime(week + '-1', '%G-W%V-%u')
+    except ValueError:
+        abort(400, 'week must look like 2026-W42')
+    min_length = timedelta(minutes=max(1, request.args.get('min_minutes', 60, type=int)))
+    slots = free_slots([venue_id], start, start + timedelta(weeks=1), min_length)[venue_id]
+    return json_response({"data": [{"start": start, "end": end} for start, end in slots], "week": week})
+
+@api.route('/', defaults={"path": ''}, methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'])
+@api.route('/<path:path>', methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'])
+def unknown(path):
+    # Routing errors are raised before the blueprint is known, so they would
+    # get the app's HTML pages: answer every other /api/v1 path here, with a
+    # 405 for the endpoints above asked with another method than GET.
+    endpoint, _ = current_app.url_map.bind_to_environ(request.environ).match(method='GET')
+    if endpoint != request.endpoint:
+        abort(405, valid_methods=['GET', 'HEAD'])
+    abort(404, 'no endpoint /api/v1/{}'.format(path))
@@ -3,16 +3,28 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, stream_template, stream_with_context, request, Response, flash, redirect, url_for, jsonify, abort
 from flask_moment import Moment
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from models import *
+from queries import *
+from search import search
+from counters import counters_cli
+from importer import import_command
+from exporter import export, export_command, FORMATS as EXPORT_FORMATS, MODELS as EXPORT_MODELS
+from conditional import conditional
+from cache import page_cache, fragment_cache, venue_key, artist_key, venue_pages, invalidate_venue, invalidate_artist, invalidate_show
+from api import api
+from pool import configure_engine, pool_stats
+from profiler import profiler
+from metrics import metrics
+from logs import log_pipeline
+from scheduling import conflicts, lock_schedule
+from upcoming import upcoming_cli, use_read_model, refresh as refresh_upcoming
+from jobs import jobs_cli, enqueue
+from dates import format_datetime
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -23,22 +35,39 @@ app.config.from_object('config')
 
 # TODO: connect to a local postgresql database
 
+configure_engine(app)
+configure_replicas(app)
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=include_object)
+page_cache.init_app(app)
+fragment_cache.init_app(app)
+profiler.init_app(app)
+metrics.init_app(app)
+app.cli.add_command(counters_cli)
+app.cli.add_command(upcoming_cli)
+app.cli.add_command(jobs_cli)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.register_blueprint(api, url_prefix='/api/v1')
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
 app.jinja_env.filters['datetime'] = format_datetime
 
+def as_flag(value):
+  return value.lower() in ('1', 'true', 'yes', 'on')
+
+def show_filters():
+  # the /shows query string as show_query filters
+  return {
+    "upcoming": request.args.get('upcoming', False, type=as_flag),
+    "start": request.args.get('from', type=datetime.fromisoformat),
+    "end": request.args.get('to', type=datetime.fromisoformat),
+    "venue_id": request.args.get('venue_id', type=int),
+    "artist_id": request.args.get('artist_id', type=int),
+  }
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -52,91 +81,38 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
+@conditional(lambda: list_validators(Venue))
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  current_time = datetime.now()
-  data = []
-  locations = Venue.query.distinct(Venue.city, Venue.state).all()
-  for location in locations:
-    venues = []
-    venue_data = Venue.query.filter(Venue.city == location.city)
-    for venue in venue_data:
-      venues.append({
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": Show.query.filter(Show.venue_id == venue.id, Show.start_time > current_time).count(),
-      })
-    data.append({
-        "city": location.city,
-        "state": location.state,
-        "venues": venues
-    })
-
+  # num_upcoming_shows is read from the maintained upcoming_show_count.
+  # ?genre=Jazz&genre=Blues lists only venues tagged with any of those genres
+  data = venue_areas(request.args.getlist('genre'))
   return render_template('pages/venues.html', areas=data)
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+  # Case-insensitive partial match: "Hop" returns "The Musical Hop",
+  # "Music" returns "The Musical Hop" and "Park Square Live Music & Coffee".
   search_term = request.form.get('search_term', '')
-  search_result = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
-
-  response={
-    "count": len(search_result),
-    "data": search_result
-  }
-
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  genres = request.form.getlist('genre')
+  try:
+    response = search(Venue, search_term, after=request.form.get('after'), genres=genres)
+  except ValueError:
+    abort(400, 'invalid cursor')
+  return render_template('pages/search_venues.html', results=response, search_term=search_term, genres=genres)
 
 @app.route('/venues/<int:venue_id>')
+@read_only
+@conditional(venue_validators)
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id 
-  venue = Venue.query.get(venue_id)
-  if venue == None:
+  data = page_cache.get_or_set(venue_key(venue_id), lambda: venue_detail(venue_id))
+  if data == None:
     return redirect(url_for('venues'))
-  
-  current_time = datetime.now()
-  pass_shows = []
-  data_pass_shows = db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).filter(Show.start_time <= current_time).all() 
-  for show in data_pass_shows:
-    pass_shows.append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
-    })
-
-  upcoming_shows = []
-  data_upcoming_shows = db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).filter(Show.start_time > current_time).all()
-  for show in data_upcoming_shows:
-    upcoming_shows.append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
-    })
-  data = {
-    "id": venue.id,
-    "name": venue.name,
-    "genres": json.loads(venue.genres) if venue.genres != '' else [],
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website_link,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description": venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": pass_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(pass_shows),
-    "upcoming_shows_count": len(upcoming_shows),
-  }
-  return render_template('pages/show_venue.html', venue=data)
+
+  venue = with_split_shows(data, VENUE_SHOW_KEYS, datetime.now())
+  return render_template('pages/show_venue.html', venue=venue)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -165,7 +141,7 @@ def create_venue_submission():
       phone = form.phone.data,
       image_link = form.image_link.data,
       facebook_link = form.facebook_link.data,
-      genres = json.dumps(form.genres.data),
+      genres = genres_named(form.genres.data),
       website_link = form.website_link.data,
       seeking_talent = form.seeking_talent.data,
       seeking_description = form.seeking_description.data
@@ -179,8 +155,6 @@ def create_venue_submission():
     # TODO: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
-  finally:
-    db.session.close()
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
@@ -193,7 +167,7 @@ def edit_venue(venue_id):
   # TODO: populate form with values from venue with ID <venue_id>
   form = VenueForm()
   form.name.data = venue.name
-  form.genres.data = venue.genres
+  form.genres.data = [genre.name for genre in venue.genres]
   form.address.data = venue.address
   form.city.data = venue.city
   form.state.data = venue.state
@@ -219,7 +193,7 @@ def edit_venue_submission(venue_id):
   try:     
     venue = Venue.query.get(venue_id)
     venue.name = form.name.data
-    venue.genres = json.dumps(form.genres.data)
+    venue.genres = genres_named(form.genres.data)
     venue.address = form.address.data
     venue.city = form.city.data
     venue.state = form.state.data
@@ -230,13 +204,18 @@ def edit_venue_submission(venue_id):
     venue.seeking_description = form.seeking_description.data
     venue.image_link = form.image_link.data
     db.session.add(venue)
+    if page_cache.shared:
+      # the artist pages showing the venue are cleared in the background
+      enqueue(invalidate_venue, venue_id=venue_id)
     db.session.commit()
+    if page_cache.shared:
+      page_cache.delete(venue_key(venue_id))
+    else:
+      invalidate_venue(venue_id)
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
   except:
     db.session.rollback()
     flash('An error occurred. Venue ' + request.form.get('name') + ' could not be listed.')
-  finally:
-    db.session.close()
       
   return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -246,13 +225,15 @@ def delete_venue(venue_id):
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
   try:
     venue = Venue.query.get(venue_id) 
+    # the pages showing the venue, found while its shows are still there and
+    # cleared once it is gone, so they cannot be refilled with it
+    pages = venue_pages(venue_id)
     db.session.delete(venue)
     db.session.commit()
+    page_cache.delete(*pages)
   except:
     db.session.rollback()
     flash('An error occurred. Cannot delete venue!')
-  finally:
-    db.session.close()
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
   # return None
@@ -261,80 +242,37 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_only
+@conditional(lambda: list_validators(Artist))
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = Artist.query.all()
+  # ?genre=Jazz&genre=Blues lists only artists tagged with any of those genres
+  data = artist_list(request.args.getlist('genre'))
   return render_template('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  data = []
-  current_time = datetime.now()
+  # Case-insensitive partial match: "A" returns "Guns N Petals", "Matt Quevado"
+  # and "The Wild Sax Band", "band" returns "The Wild Sax Band".
   search_term = request.form.get('search_term', '')
-  search_result = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
-  for item in search_result:
-    data.append({
-      "id":item.id,
-      "name":item.name,
-      "num_upcoming_shows": Show.query.filter(Show.artist_id == item.id, Show.start_time > current_time).count(),
-    })
-  response = {
-    "count": len(search_result),
-    "data": data
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  genres = request.form.getlist('genre')
+  try:
+    response = search(Artist, search_term, after=request.form.get('after'), genres=genres)
+  except ValueError:
+    abort(400, 'invalid cursor')
+  return render_template('pages/search_artists.html', results=response, search_term=search_term, genres=genres)
 
 @app.route('/artists/<int:artist_id>')
+@read_only
+@conditional(artist_validators)
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  
-  artist = Artist.query.get(artist_id)
-  if artist == None:
+  data = page_cache.get_or_set(artist_key(artist_id), lambda: artist_detail(artist_id))
+  if data == None:
      return redirect(url_for('artists'))
-  
-  current_time = datetime.now()
-  pass_shows = []
-  data_pass_shows = db.session.query(Show).join(Venue).filter(Show.artist_id == artist.id).filter(Show.start_time <= current_time).all()
-  for show in data_pass_shows:
-    pass_shows.append({
-      "venue_id": show.venue.id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": str(show.start_time)
-    })
-
-  upcoming_shows = []
-  data_upcoming_shows = db.session.query(Show).join(Venue).filter(Show.artist_id == artist.id).filter(Show.start_time > current_time).all()
-  for show in data_upcoming_shows:
-    upcoming_shows.append({
-      "venue_id": show.venue.id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": str(show.start_time)
-    })
-
-  data = {
-    "id": artist.id,
-    "name": artist.name,
-    "genres": json.loads(artist.genres) if artist.genres != '' else [],
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "website": artist.website_link,
-    "facebook_link": artist.facebook_link,
-    "seeking_venue": artist.seeking_venue,
-    "seeking_description": artist.seeking_description,
-    "image_link": artist.image_link,
-    "past_shows": pass_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(pass_shows),
-    "upcoming_shows_count": len(upcoming_shows),
-  } 
-  return render_template('pages/show_artist.html', artist=data)
+
+  artist = with_split_shows(data, ARTIST_SHOW_KEYS, datetime.now())
+  return render_template('pages/show_artist.html', artist=artist)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -346,7 +284,7 @@ def edit_artist(artist_id):
   # TODO: populate form with fields from artist with ID <artist_id>
   form = ArtistForm()
   form.name.data = artist.name
-  form.genres.data = artist.genres
+  form.genres.data = [genre.name for genre in artist.genres]
   form.city.data = artist.city
   form.state.data = artist.state
   form.phone.data = artist.phone
@@ -370,7 +308,7 @@ def edit_artist_submission(artist_id):
   try:
     artist = Artist.query.get(artist_id)
     artist.name = form.name.data
-    artist.genres = json.dumps(form.genres.data)
+    artist.genres = genres_named(form.genres.data)
     artist.city = form.city.data
     artist.state = form.state.data
     artist.phone = form.phone.data
@@ -379,13 +317,18 @@ def edit_artist_submission(artist_id):
     artist.seeking_venue = form.seeking_venue.data
     artist.seeking_description = form.seeking_description.data
     artist.image_link = form.image_link.data
+    if page_cache.shared:
+      # the venue pages showing the artist are cleared in the background
+      enqueue(invalidate_artist, artist_id=artist_id)
     db.session.commit()
+    if page_cache.shared:
+      page_cache.delete(artist_key(artist_id))
+    else:
+      invalidate_artist(artist_id)
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   except:
     db.session.rollback()
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
-  finally:
-    db.session.close()
 
   return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -411,7 +354,7 @@ def create_artist_submission():
   try:
     artist = Artist(
       name = form.name.data,
-      genres = json.dumps(form.genres.data),
+      genres = genres_named(form.genres.data),
       city = form.city.data,
       state = form.state.data,
       phone = form.phone.data,
@@ -430,8 +373,6 @@ def create_artist_submission():
     # TODO: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
-  finally:
-    db.session.close()
   return render_template('pages/home.html')
 
 
@@ -439,22 +380,24 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_only
+@conditional(lambda: show_list_validators())
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  data = []
-  shows = db.session.query(Show).join(Venue).join(Artist).all()
-  for show in shows:
-    data.append({
-      'venue_id' : show.venue_id,
-      'venue_name' : show.venue.name,
-      'artist_id' : show.artist_id,
-      'artist_name' : show.artist.name,
-      'artist_image_link' : show.artist.image_link,
-      'start_time': str(show.start_time)
-    })
-
-  return render_template('pages/shows.html', shows=data)
+  # displays list of shows at /shows, a page at a time. ?stream=1 renders
+  # every matching show as the rows arrive instead.
+  filters = show_filters()
+  read_model = use_read_model(filters)
+  if request.args.get('stream', False, type=as_flag):
+    return Response(stream_template('pages/shows.html', shows=show_stream(read_model=read_model, **filters)))
+
+  try:
+    data, next_cursor = show_page(app.config['SHOWS_PAGE_SIZE'], read_model, after=request.args.get('after'), **filters)
+  except ValueError:
+    abort(400, 'invalid cursor')
+  next_url = None
+  if next_cursor:
+    next_url = url_for('shows', **dict(request.args.to_dict(), after=next_cursor))
+  return render_template('pages/shows.html', shows=data, next_url=next_url)
 
 @app.route('/shows/create')
 def create_shows():
@@ -465,28 +408,77 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
+  # the venue's and artist's upcoming_show_count are bumped by the Show insert event
+  form = ShowForm(request.form)
+  if not form.validate():
+    for error in form.errors:
+      for error_msg in form.errors[error]:
+        flash(error_msg)
+    return redirect(url_for('create_shows'))
+  # a venue or an artist can only play one show at a time
+  venue_id, artist_id, end_time = int(form.venue_id.data), int(form.artist_id.data), form.end_time()
+  lock_schedule()
+  clashes = conflicts(venue_id, artist_id, form.start_time.data, end_time)
+  if clashes:
+    db.session.rollback()
+    booked = 'Venue' if clashes[0].venue_id == venue_id else 'Artist'
+    flash('{} is already booked from {} to {}.'.format(booked, clashes[0].start_time, clashes[0].end_time))
+    return redirect(url_for('create_shows'))
   try:
-    form = ShowForm(request.form)
     show = Show(
-      artist_id = form.artist_id,
-      venue_id = form.venue_id,
-      start_time = form.start_time
+      artist_id = artist_id,
+      venue_id = venue_id,
+      start_time = form.start_time.data,
+      end_time = end_time
     )
     db.session.add(show)
+    if show.start_time > datetime.now():
+      # list it on /shows?upcoming=1 without waiting for the periodic refresh
+      enqueue(refresh_upcoming, unique=True)
     db.session.commit()
+    invalidate_show(show)
     # on successful db insert, flash success
     flash('Show was successfully listed!')
-  except():
+  except:
     db.session.rollback()
-    # TODO: on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Show could not be listed.')
     flash('An error occurred. Show could not be listed.')
-  finally:
-    db.session.close()
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<entity>.<format>')
+@read_only
+def export_catalogue(entity, format):
+  # streams the whole venue, artist or show table, e.g. /export/shows.csv
+  if entity not in EXPORT_MODELS or format not in EXPORT_FORMATS:
+    abort(404)
+  try:
+    chunks = export(entity, format)
+  except ImportError as e:
+    # parquet needs pyarrow, which is optional
+    abort(501, '{} export needs the {} package'.format(format, e.name))
+  return Response(
+    stream_with_context(chunks),
+    mimetype=EXPORT_FORMATS[format],
+    headers={'Content-Disposition': 'attachment; filename={}.{}'.format(entity, format)}
+  )
+
+@app.route('/cache/stats')
+def cache_stats():
+  return jsonify(dict(page_cache.stats(), fragments=fragment_cache.stats()))
+
+@app.route('/metrics')
+def prometheus_metrics():
+  return Response(metrics.exposition(db.engines), mimetype='text/plain; version=0.0.4')
+
+@app.route('/pool/stats')
+def connection_pool_stats():
+  # checkouts, time spent waiting for a connection and current pool usage,
+  # by bind: 'primary' and each replica
+  return jsonify(pool_stats(db.engines))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -496,14 +488,7 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    log_pipeline.init_app(app)
 
 #----------------------------------------------------------------------------#
 # Launch.
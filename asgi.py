@@ -0,0 +1,166 @@
+import asyncio
+import re
+from datetime import datetime
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, redirect, render_template, request, url_for
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from app import app, as_flag, show_filters
+from cache import page_cache, venue_key, artist_key
+from conditional import async_conditional
+from models import Venue, Artist
+from queries import with_split_shows, VENUE_SHOW_KEYS, ARTIST_SHOW_KEYS
+import aio
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#----------------------------------------------------------------------------#
+
+# Run with any ASGI server, e.g.
+#
+#   uvicorn asgi:application --workers 4
+#
+# GET /venues, /artists, /shows and the venue and artist pages are answered
+# from asyncio using the async queries in aio.py, the same way as the Flask
+# views: ETag/Last-Modified validators and Cache-Control from conditional.py,
+# the page cache for venue and artist pages, and reads from a replica in
+# DATABASE_REPLICA_URLS unless the client has just written. Every other
+# request goes to the Flask app through asgiref's WSGI adapter. Needs
+# asgiref, plus asyncpg for Postgres or aiosqlite for SQLite.
+#
+# Templates render, and reach the Redis cache, in worker threads rather than
+# on the event loop; see render() and Cache.aget_or_set.
+
+async def render(template, **context):
+    # asyncio.to_thread carries the Flask contexts over with the contextvars
+    return await asyncio.to_thread(render_template, template, **context)
+
+@async_conditional(lambda engines: aio.list_validators(engines, Venue))
+async def venues(engines):
+    data = await aio.venue_areas(engines.read, request.args.getlist('genre'))
+    return await render('pages/venues.html', areas=data)
+
+@async_conditional(aio.venue_validators)
+async def show_venue(engines, venue_id):
+    venue_id = int(venue_id)
+    data = await page_cache.aget_or_set(venue_key(venue_id), lambda: aio.venue_detail(engines.primary, venue_id))
+    if data is None:
+        return redirect(url_for('venues'))
+    venue = with_split_shows(data, VENUE_SHOW_KEYS, datetime.now())
+    return await render('pages/show_venue.html', venue=venue)
+
+@async_conditional(lambda engines: aio.list_validators(engines, Artist))
+async def artists(engines):
+    data = await aio.artist_list(engines.read, request.args.getlist('genre'))
+    return await render('pages/artists.html', artists=data)
+
+@async_conditional(aio.artist_validators)
+async def show_artist(engines, artist_id):
+    artist_id = int(artist_id)
+    data = await page_cache.aget_or_set(artist_key(artist_id), lambda: aio.artist_detail(engines.primary, artist_id))
+    if data is None:
+        return redirect(url_for('artists'))
+    artist = with_split_shows(data, ARTIST_SHOW_KEYS, datetime.now())
+    return await render('pages/show_artist.html', artist=artist)
+
+@async_conditional(aio.show_list_validators)
+async def shows(engines):
+    if request.args.get('stream', False, type=as_flag):
+        # left to the Flask view, which streams from a server side cursor
+        return None
+    try:
+        data, next_cursor = await aio.show_page(
+            engines.read, app.config['SHOWS_PAGE_SIZE'], after=request.args.get('after'), **show_filters()
+        )
+    except ValueError:
+        abort(400, 'invalid cursor')
+    next_url = None
+    if next_cursor:
+        next_url = url_for('shows', **dict(request.args.to_dict(), after=next_cursor))
+    return await render('pages/shows.html', shows=data, next_url=next_url)
+
+ROUTES = [
+    (re.compile(r'/venues'), venues),
+    (re.compile(r'/venues/(\d+)'), show_venue),
+    (re.compile(r'/artists'), artists),
+    (re.compile(r'/artists/(\d+)'), show_artist),
+    (re.compile(r'/shows'), shows),
+]
+
+
+class ReadPath:
+    # ASGI app answering ROUTES itself and handing everything else to the
+    # WSGI app. Views run inside a Flask request context, so templates,
+    # url_for, the session and before/after_request hooks work as usual.
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.engine = aio.create_engine(app.config)
+        self.replicas = aio.create_replica_engines(app.config)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, view in ROUTES:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    response = await self.dispatch(scope, view, match.groups())
+                    if response is not None:
+                        return await self.respond(scope, send, response)
+                    break
+        await self.wsgi(scope, receive, send)
+
+    async def dispatch(self, scope, view, args):
+        headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+        host = dict((name.lower(), value) for name, value in headers).get('host')
+        if host is None:
+            host = '{}:{}'.format(*scope['server'])
+        environ = EnvironBuilder(
+            path=scope['path'],
+            base_url='{}://{}{}'.format(scope['scheme'], host, scope.get('root_path', '')),
+            query_string=scope['query_string'].decode('latin-1'),
+            method=scope['method'],
+            headers=headers,
+        ).get_environ()
+        with self.app.request_context(environ):
+            try:
+                result = self.app.preprocess_request()
+                if result is None:
+                    result = await view(aio.request_engines(self.engine, self.replicas), *args)
+                if result is None:
+                    return None
+                response = self.app.make_response(result)
+            except HTTPException as e:
+                response = self.app.make_response(self.app.handle_http_exception(e))
+            except Exception as e:
+                response = self.app.make_response(self.app.handle_exception(e))
+            return self.app.process_response(response)
+
+    async def respond(self, scope, send, response):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in response.headers.items()
+            ],
+        })
+        body = b'' if scope['method'] == 'HEAD' else response.get_data()
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def dispose(self):
+        for engine in [self.engine] + self.replicas:
+            await engine.dispose()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = ReadPath(app)
@@ -0,0 +1,166 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, text
+from models import db, Genre, Venue, Artist, Show, venue_genres, artist_genres
+from counters import reconcile
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+CITIES = [
+    ('San Francisco', 'CA'),
+    ('New York', 'NY'),
+    ('Austin', 'TX'),
+    ('Seattle', 'WA'),
+    ('Chicago', 'IL'),
+    ('Nashville', 'TN'),
+    ('Denver', 'CO'),
+    ('Portland', 'OR'),
+]
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Folk', 'Jazz', 'Pop', 'Rock n Roll']
+
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Wild', 'Silver', 'Midnight', 'Rusty', 'Crimson', 'Lucky']
+NOUNS = ['Note', 'Room', 'Lantern', 'Owl', 'Anchor', 'Garden', 'Sax', 'Hop', 'Fox', 'Harbor']
+VENUE_KINDS = ['Hall', 'Lounge', 'Club', 'Tavern', 'Theatre', 'Coffee House']
+ARTIST_KINDS = ['Band', 'Trio', 'Quartet', 'Collective', 'Orchestra', 'Project']
+
+# (venues, artists, shows) for each --scale of the benchmarks
+SCALES = {
+    '1k': (100, 200, 1000),
+    '100k': (2000, 5000, 100000),
+    '10m': (100000, 200000, 10000000),
+}
+
+# shows are spread over a year either side of now in slots of SLOT, each
+# lasting one of DURATIONS minutes
+SLOT = timedelta(hours=4)
+DURATIONS = [60, 90, 120, 180]
+
+BATCH_SIZE = 10000
+
+def _insert(model, rows):
+    db.session.execute(insert(model), rows)
+
+def _genre_ids():
+    # Creates any of GENRES missing from the Genre table.
+    existing = set(db.session.scalars(select(Genre.name)))
+    missing = [{"name": name} for name in GENRES if name not in existing]
+    if missing:
+        _insert(Genre, missing)
+    return db.session.scalars(select(Genre.id).where(Genre.name.in_(GENRES)).order_by(Genre.id)).all()
+
+def _name(rng, kinds, i):
+    # "The Velvet Owl Lounge 42": names repeat words, as search would expect,
+    # the number keeps them unique
+    return 'The {} {} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS), rng.choice(kinds), i)
+
+def _profile(rng, kind, i):
+    seeking = rng.random() < 0.5
+    return {
+        "image_link": "https://images.example.com/{}/{}.jpg".format(kind, i),
+        "facebook_link": "https://www.facebook.com/{}{}".format(kind, i),
+        "website_link": "https://{}{}.example.com".format(kind, i) if rng.random() < 0.7 else None,
+        "seeking_description": "Looking for {} {}.".format(
+            rng.choice(GENRES).lower(), 'artists' if kind == 'venue' else 'venues') if seeking else None,
+    }, seeking
+
+def _reset_sequences():
+    # Rows are inserted with explicit ids, which Postgres serial columns do
+    # not notice. Moves each sequence past the largest id so later inserts
+    # work.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in (Venue, Artist, Show):
+        table = model.__table__.name
+        db.session.execute(
+            text("SELECT setval(pg_get_serial_sequence(:table, 'id'), :id)"),
+            {"table": '"{}"'.format(table), "id": db.session.scalar(select(func.max(model.id))) or 1},
+        )
+
+def seed(venues, artists, shows, seed=0, now=None):
+    # Inserts `venues` venues, `artists` artists and `shows` shows spread over
+    # a year either side of `now`. The same seed always yields the same data,
+    # apart from the dates when `now` is left to the clock.
+    rng = random.Random(seed)
+    if now is None:
+        now = datetime.now().replace(microsecond=0)
+
+    genre_ids = _genre_ids()
+
+    rows, links = [], []
+    for i in range(1, venues + 1):
+        city, state = rng.choice(CITIES)
+        profile, seeking = _profile(rng, 'venue', i)
+        rows.append(dict(
+            profile,
+            id=i,
+            name=_name(rng, VENUE_KINDS, i),
+            city=city,
+            state=state,
+            address="{} Main Street".format(i),
+            phone="555-555-{:04d}".format(i % 10000),
+            seeking_talent=seeking,
+        ))
+        links.extend({"venue_id": i, "genre_id": id} for id in rng.sample(genre_ids, 2))
+        if len(rows) == BATCH_SIZE:
+            _insert(Venue, rows)
+            db.session.execute(insert(venue_genres), links)
+            rows, links = [], []
+    if rows:
+        _insert(Venue, rows)
+        db.session.execute(insert(venue_genres), links)
+
+    rows, links = [], []
+    for i in range(1, artists + 1):
+        city, state = rng.choice(CITIES)
+        profile, seeking = _profile(rng, 'artist', i)
+        rows.append(dict(
+            profile,
+            id=i,
+            name=_name(rng, ARTIST_KINDS, i),
+            city=city,
+            state=state,
+            phone="555-555-{:04d}".format(i % 10000),
+            seeking_venue=seeking,
+        ))
+        links.extend({"artist_id": i, "genre_id": id} for id in rng.sample(genre_ids, 2))
+        if len(rows) == BATCH_SIZE:
+            _insert(Artist, rows)
+            db.session.execute(insert(artist_genres), links)
+            rows, links = [], []
+    if rows:
+        _insert(Artist, rows)
+        db.session.execute(insert(artist_genres), links)
+
+    # Shows fit in SLOT long slots, and no venue or artist is in any slot
+    # twice, so nobody is double booked.
+    slots = int(timedelta(days=730) / SLOT)
+    per_slot, extra = divmod(shows, slots)
+    if per_slot + bool(extra) > min(venues, artists):
+        raise ValueError('{} shows need more venues and artists'.format(shows))
+    extra_slots = set(rng.sample(range(slots), extra))
+    first = now - timedelta(days=365)
+    rows, id = [], 0
+    for slot in range(slots):
+        count = per_slot + (slot in extra_slots)
+        for venue_id, artist_id in zip(rng.sample(range(1, venues + 1), count), rng.sample(range(1, artists + 1), count)):
+            id += 1
+            minutes = rng.choice(DURATIONS)
+            start_time = first + slot * SLOT + timedelta(minutes=rng.randrange(0, SLOT // timedelta(minutes=1) - minutes + 1, 15))
+            rows.append({
+                "id": id,
+                "venue_id": venue_id,
+                "artist_id": artist_id,
+                "start_time": start_time,
+                "end_time": start_time + timedelta(minutes=minutes),
+            })
+            if len(rows) == BATCH_SIZE:
+                _insert(Show, rows)
+                rows = []
+    if rows:
+        _insert(Show, rows)
+    _reset_sequences()
+    db.session.commit()
+    # bulk inserts bypass the Show events that maintain the counters
+    reconcile(now)
@@ -0,0 +1,75 @@
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+import dates
+from dates import FORMATS, format_datetime, format_datetimes
+#----------------------------------------------------------------------------#
+# Date formatting benchmark.
+#----------------------------------------------------------------------------#
+
+# Times formatting a page worth of show start times the way the `datetime`
+# filter used to (str(), dateutil parse, babel) against dates.py, one value
+# at a time and as a batch:
+#
+#   python -m benchmarks.datetimes --values 10000 --distinct 500
+#
+# Shows start on the hour, so a page repeats far fewer distinct times than
+# it has tiles; --distinct sets how many.
+
+def parse_and_format(value, format='medium'):
+    # the filter before dates.py, fed str(start_time)
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, FORMATS.get(format, format), locale='en')
+
+def start_times(count, distinct, rng):
+    first = datetime(2027, 1, 1, 18)
+    times = [first + timedelta(hours=4 * i) for i in range(distinct)]
+    return sorted(rng.choice(times) for _ in range(count))
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def cold(fn):
+    def run():
+        dates._format.cache_clear()
+        fn()
+    return run
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--values', type=int, default=10000)
+    parser.add_argument('--distinct', type=int, default=500)
+    parser.add_argument('--format', default='full')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    values = start_times(args.values, args.distinct, random.Random(1))
+    strings = [str(value) for value in values]
+    expected = [parse_and_format(value, args.format) for value in strings]
+    assert [format_datetime(value, args.format) for value in values] == expected
+    assert format_datetimes(values, args.format) == expected
+
+    cases = [
+        ('str + parse + babel', lambda: [parse_and_format(value, args.format) for value in strings]),
+        ('filter, cold memo', cold(lambda: [format_datetime(value, args.format) for value in values])),
+        ('filter, warm memo', lambda: [format_datetime(value, args.format) for value in values]),
+        ('batch', lambda: format_datetimes(values, args.format)),
+    ]
+    print('{} values, {} distinct, format {!r}'.format(args.values, args.distinct, args.format))
+    baseline = None
+    for name, fn in cases:
+        median = timed(fn, args.rounds)
+        baseline = baseline or median
+        print('  {:<20} median {:9.2f} ms   {:7.1f}x'.format(name, median, baseline / median))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+#----------------------------------------------------------------------------#
+# Load test.
+#----------------------------------------------------------------------------#
+
+# Hammers the read-only pages of one or more running servers with concurrent
+# keep-alive clients and reports requests per second and latency percentiles
+# for each, e.g. the sync app against the ASGI entry point on the same data:
+#
+#   flask run --port 5000 --without-threads   (or gunicorn -w 4 app:app)
+#   uvicorn asgi:application --port 8000 --workers 4
+#   python -m benchmarks.loadtest http://127.0.0.1:5000 http://127.0.0.1:8000
+#
+# Only the standard library is used so nothing extra needs installing on
+# the machine generating the load.
+
+DEFAULT_PATHS = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+def client(base_url, paths, deadline, latencies, errors):
+    url = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_class(url.netloc, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        path = url.path.rstrip('/') + paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(e)
+            connection.close()
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    connection.close()
+
+def run(base_url, paths, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(base_url, paths, deadline, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float('nan')
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else float('nan'),
+        "p99": percentile(0.99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('urls', nargs='+', help='Base URLs of the servers to compare.')
+    parser.add_argument('--path', action='append', dest='paths', help='Page to request; repeatable.')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per server.')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds of unmeasured load first.')
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    for url in args.urls:
+        if args.warmup:
+            run(url, paths, args.concurrency, args.warmup)
+        result = run(url, paths, args.concurrency, args.duration)
+        print('{}\n  {:>8.1f} req/s   p50 {:8.2f} ms   p99 {:8.2f} ms   {} requests, {} errors'.format(
+            url, result["rps"], result["p50"], result["p99"], result["requests"], result["errors"]))
+
+if __name__ == '__main__':
+    main()
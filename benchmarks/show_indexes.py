@@ -0,0 +1,79 @@
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+from flask import Flask
+from sqlalchemy import text
+from models import db, Show
+from queries import venue_shows, artist_shows
+from benchmarks.datagen import seed
+#----------------------------------------------------------------------------#
+# Show index benchmark.
+#----------------------------------------------------------------------------#
+
+# Seeds a large Show table and times the detail page queries with the Show
+# indexes dropped and then recreated:
+#
+#   python -m benchmarks.show_indexes --database-url sqlite:////tmp/fyyur.db
+#
+# The database named by --database-url is dropped and recreated.
+
+def timed(fn, ids):
+    samples = []
+    for id in ids:
+        start = time.perf_counter()
+        fn(id)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def upcoming_shows_page(_):
+    return Show.query.filter(Show.start_time > datetime.now()) \
+        .order_by(Show.start_time).limit(50).all()
+
+def run(rounds, venues, artists):
+    rng = random.Random(1)
+    venue_ids = [rng.randint(1, venues) for _ in range(rounds)]
+    artist_ids = [rng.randint(1, artists) for _ in range(rounds)]
+    return {
+        "venue page": timed(venue_shows, venue_ids),
+        "artist page": timed(artist_shows, artist_ids),
+        "upcoming shows": timed(upcoming_shows_page, range(rounds)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print('seeding {} shows...'.format(args.shows))
+        seed(args.venues, args.artists, args.shows)
+
+        indexes = Show.__table__.indexes
+        for index in indexes:
+            index.drop(db.engine)
+        results = {"without indexes": run(args.rounds, args.venues, args.artists)}
+        for index in indexes:
+            index.create(db.engine)
+        with db.engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+        results["with indexes"] = run(args.rounds, args.venues, args.artists)
+
+    for label, timings in results.items():
+        print(label)
+        for name, (median, p95) in timings.items():
+            print('  {:<16} median {:8.2f} ms   p95 {:8.2f} ms'.format(name, median, p95))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from benchmarks.datagen import SCALES, GENRES, seed
+#----------------------------------------------------------------------------#
+# View benchmarks.
+#----------------------------------------------------------------------------#
+
+# Seeds a database at one of the datagen SCALES, times every view in app.py
+# through the Flask test client and writes the timings to JSON:
+#
+#   python -m benchmarks.views --scale 1k
+#   python -m benchmarks.views --scale 100k --database-url postgresql://localhost/fyyur_bench
+#
+# The database named by --database-url (a throwaway SQLite file by default)
+# is dropped and rebuilt from the migrations. Timings are compared with the
+# baseline saved for the scale by --save-baseline; the run fails if any
+# view's median got slower than the baseline by more than --threshold, and
+# also when there is no baseline to compare with. Baselines only mean
+# something on the machine that recorded them, so neither they nor the
+# results are committed.
+#
+# Pages are rendered with the page cache off (CACHE_BACKEND=none) unless
+# CACHE_BACKEND is set, so the queries are timed rather than the cache.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+#----------------------------------------------------------------------------#
+# Cases.
+#----------------------------------------------------------------------------#
+
+# Each case builds one request from a seeded Random: (method, path, form).
+# Anything a case needs in the database is set up while building, outside
+# the timed part. Edits post a row's current values back, so the data does
+# not drift between runs.
+
+def _venue_form(venue):
+    return {
+        "name": venue.name, "city": venue.city, "state": venue.state, "address": venue.address,
+        "phone": venue.phone, "image_link": venue.image_link or '', "facebook_link": venue.facebook_link,
+        "website_link": venue.website_link or '', "genres": [genre.name for genre in venue.genres],
+        "seeking_talent": 'y' if venue.seeking_talent else '', "seeking_description": venue.seeking_description or '',
+    }
+
+def _artist_form(artist):
+    return {
+        "name": artist.name, "city": artist.city, "state": artist.state, "phone": artist.phone,
+        "image_link": artist.image_link or '', "facebook_link": artist.facebook_link,
+        "website_link": artist.website_link or '', "genres": [genre.name for genre in artist.genres],
+        "seeking_venue": 'y' if artist.seeking_venue else '', "seeking_description": artist.seeking_description or '',
+    }
+
+def _new_venue(rng):
+    return {
+        "name": "Benchmark Venue", "city": "San Francisco", "state": "CA", "address": "1 Main Street",
+        "phone": "555-555-0000", "facebook_link": "https://www.facebook.com/benchmark",
+        "genres": rng.sample(GENRES, 2),
+    }
+
+def _new_artist(rng):
+    return {
+        "name": "Benchmark Artist", "city": "San Francisco", "state": "CA", "phone": "555-555-0000",
+        "facebook_link": "https://www.facebook.com/benchmark", "genres": rng.sample(GENRES, 2),
+    }
+
+def _throwaway_venue():
+    from models import db, Venue
+    venue_id = db.session.execute(insert(Venue).values(name='Benchmark Venue').returning(Venue.id)).scalar()
+    db.session.commit()
+    return venue_id
+
+def cases(scale):
+    from models import db, Venue, Artist
+    venues, artists, _ = SCALES[scale]
+    venue = lambda rng: db.session.get(Venue, rng.randint(1, venues))
+    artist = lambda rng: db.session.get(Artist, rng.randint(1, artists))
+    # far enough ahead not to clash with the seeded shows
+    start_time = lambda rng: (datetime.now() + timedelta(days=rng.randint(800, 36500))).strftime('%Y-%m-%d %H:%M:%S')
+    # (name, endpoint, build)
+    return [
+        ('home', 'index', lambda rng: ('GET', '/', None)),
+        ('venues', 'venues', lambda rng: ('GET', '/venues', None)),
+        ('venues by genre', 'venues', lambda rng: ('GET', '/venues?genre=' + rng.choice(GENRES), None)),
+        ('search venues', 'search_venues', lambda rng: ('POST', '/venues/search', {"search_term": rng.choice(['hop', 'blue', 'lounge 1'])})),
+        ('venue page', 'show_venue', lambda rng: ('GET', '/venues/{}'.format(rng.randint(1, venues)), None)),
+        ('new venue form', 'create_venue_form', lambda rng: ('GET', '/venues/create', None)),
+        ('create venue', 'create_venue_submission', lambda rng: ('POST', '/venues/create', _new_venue(rng))),
+        ('edit venue form', 'edit_venue', lambda rng: ('GET', '/venues/{}/edit'.format(rng.randint(1, venues)), None)),
+        ('edit venue', 'edit_venue_submission', lambda rng: (lambda v: ('POST', '/venues/{}/edit'.format(v.id), _venue_form(v)))(venue(rng))),
+        ('delete venue', 'delete_venue', lambda rng: ('POST', '/venues/{}/delete'.format(_throwaway_venue()), None)),
+        ('artists', 'artists', lambda rng: ('GET', '/artists', None)),
+        ('artists by genre', 'artists', lambda rng: ('GET', '/artists?genre=' + rng.choice(GENRES), None)),
+        ('search artists', 'search_artists', lambda rng: ('POST', '/artists/search', {"search_term": rng.choice(['band', 'velvet', 'trio 2'])})),
+        ('artist page', 'show_artist', lambda rng: ('GET', '/artists/{}'.format(rng.randint(1, artists)), None)),
+        ('edit artist form', 'edit_artist', lambda rng: ('GET', '/artists/{}/edit'.format(rng.randint(1, artists)), None)),
+        ('edit artist', 'edit_artist_submission', lambda rng: (lambda a: ('POST', '/artists/{}/edit'.format(a.id), _artist_form(a)))(artist(rng))),
+        ('new artist form', 'create_artist_form', lambda rng: ('GET', '/artists/create', None)),
+        ('create artist', 'create_artist_submission', lambda rng: ('POST', '/artists/create', _new_artist(rng))),
+        ('shows', 'shows', lambda rng: ('GET', '/shows', None)),
+        ('upcoming shows', 'shows', lambda rng: ('GET', '/shows?upcoming=1', None)),
+        ('shows at a venue', 'shows', lambda rng: ('GET', '/shows?venue_id={}'.format(rng.randint(1, venues)), None)),
+        ('new show form', 'create_shows', lambda rng: ('GET', '/shows/create', None)),
+        ('create show', 'create_show_submission', lambda rng: ('POST', '/shows/create', {
+            "venue_id": rng.randint(1, venues), "artist_id": rng.randint(1, artists), "start_time": start_time(rng)})),
+        ('export venues', 'export_catalogue', lambda rng: ('GET', '/export/venues.csv', None)),
+        ('cache stats', 'cache_stats', lambda rng: ('GET', '/cache/stats', None)),
+        ('metrics', 'prometheus_metrics', lambda rng: ('GET', '/metrics', None)),
+        ('pool stats', 'connection_pool_stats', lambda rng: ('GET', '/pool/stats', None)),
+    ]
+
+def uncovered(app, cases):
+    # Endpoints of app.py that no case requests.
+    covered = set(endpoint for _, endpoint, _ in cases)
+    return sorted(
+        endpoint for endpoint in app.view_functions
+        if endpoint != 'static' and '.' not in endpoint and endpoint not in covered
+    )
+
+#----------------------------------------------------------------------------#
+# Running.
+#----------------------------------------------------------------------------#
+
+def prepare(app, scale):
+    # Rebuilds the schema from the migrations and seeds it.
+    from flask_migrate import downgrade, upgrade
+    from models import db
+    directory = os.path.join(os.path.dirname(HERE), 'migrations')
+    with app.app_context():
+        downgrade(directory=directory, revision='base')
+        upgrade(directory=directory)
+        seed(*SCALES[scale])
+        db.session.remove()
+
+def measure(app, build, rounds, warmup, seed=0):
+    # Milliseconds taken by each of `rounds` requests, after `warmup`
+    # unmeasured ones.
+    from models import db
+    rng = random.Random(seed)
+    client = app.test_client()
+    samples = []
+    for i in range(warmup + rounds):
+        with app.app_context():
+            method, path, data = build(rng)
+            db.session.remove()
+        start = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError('{} {} returned {}'.format(method, path, response.status_code))
+        if i >= warmup:
+            samples.append(elapsed * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "min_ms": round(samples[0], 3),
+        "rounds": rounds,
+    }
+
+def regressions(results, baseline, threshold, min_ms):
+    # (name, baseline median, median) for every case slower than the
+    # baseline by more than `threshold` (a fraction) and at least `min_ms`.
+    slower = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        before, after = before["median_ms"], result["median_ms"]
+        if after > before * (1 + threshold) and after - before >= min_ms:
+            slower.append((name, before, after))
+    return slower
+
+def report(results, baseline):
+    print('{:<20} {:>10} {:>10} {:>10} {:>9}'.format('view', 'median ms', 'p95 ms', 'baseline', 'change'))
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("median_ms")
+        change = '{:+.0%}'.format(result["median_ms"] / before - 1) if before else ''
+        print('{:<20} {:>10.2f} {:>10.2f} {:>10} {:>9}'.format(
+            name, result["median_ms"], result["p95_ms"], '{:.2f}'.format(before) if before else '-', change))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--database-url', help='Dropped and reseeded. A temporary SQLite file by default.')
+    parser.add_argument('--reuse', action='store_true', help='Keep the data already seeded at --database-url.')
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='Results file. benchmarks/results/<scale>.json by default.')
+    parser.add_argument('--baseline', help='Baseline file. benchmarks/baselines/<scale>.json by default.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown of a median, as a fraction.')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='Slowdowns smaller than this are noise.')
+    parser.add_argument('--only', action='append', help='Run only the named case; repeatable.')
+    args = parser.parse_args()
+    output = args.output or os.path.join(HERE, 'results', args.scale + '.json')
+    baseline_path = args.baseline or os.path.join(HERE, 'baselines', args.scale + '.json')
+
+    # app.py reads its configuration when imported
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur-bench-{}.db'.format(args.scale))
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    from app import app
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    selected = cases(args.scale)
+    missing = uncovered(app, selected)
+    if missing:
+        sys.exit('no benchmark for: {}'.format(', '.join(missing)))
+    if args.only:
+        selected = [case for case in selected if case[0] in args.only]
+    if not args.reuse:
+        print('seeding {} ({} venues, {} artists, {} shows)...'.format(args.scale, *SCALES[args.scale]))
+        prepare(app, args.scale)
+
+    results = {}
+    for name, _, build in selected:
+        results[name] = measure(app, build, args.rounds, args.warmup)
+
+    run = {
+        "scale": args.scale,
+        "database": os.environ['DATABASE_URL'].split(':', 1)[0],
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+    print('results written to {}'.format(output))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(run, f, indent=2)
+        print('saved as the baseline for {}'.format(args.scale))
+    elif not baseline:
+        sys.exit('no baseline at {}; run with --save-baseline to store one'.format(baseline_path))
+    else:
+        slower = regressions(results, baseline, args.threshold, args.min_ms)
+        for name, before, after in slower:
+            print('REGRESSION {}: median {:.2f} ms -> {:.2f} ms'.format(name, before, after))
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
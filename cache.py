@@ -0,0 +1,246 @@
+import asyncio
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from models import db, Show
+from jobs import job
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUBackend:
+    # In-process store holding at most `maxsize` entries, each expiring `ttl`
+    # seconds after it was set.
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisBackend:
+    # Shared store on any client with the redis-py get/set/delete interface.
+    def __init__(self, client, ttl=300, prefix='fyyur:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+async def _call(fn, *args):
+    return fn(*args)
+
+
+class Cache:
+    # Read-through cache in front of a backend, counting hits and misses.
+    def __init__(self, app=None):
+        self.backend = None
+        # whether every process sees the same entries
+        self.shared = False
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, maxsize=None):
+        ttl = app.config.get('CACHE_TTL', 300)
+        backend = app.config.get('CACHE_BACKEND', 'none')
+        if backend == 'redis':
+            client = app.config.get('CACHE_REDIS_CLIENT')
+            if client is None:
+                import redis
+                client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+            self.backend = RedisBackend(client, ttl=ttl)
+        elif backend == 'lru':
+            self.backend = LRUBackend(maxsize or app.config.get('CACHE_MAXSIZE', 1024), ttl=ttl)
+        else:
+            self.backend = None
+        self.shared = backend == 'redis'
+
+    def get_or_set(self, key, load):
+        # Returns the cached value for key, or calls load() and caches its
+        # result. None results are not cached.
+        if self.backend is None:
+            return load()
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        # a replica may not have caught up with the write that invalidated key
+        with db.session().primary():
+            value = load()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    async def aget_or_set(self, key, load):
+        # get_or_set for the async views: load is a coroutine function, which
+        # should read from the primary for the reason above. A shared backend
+        # is a blocking network client, so it is called from a worker thread.
+        if self.backend is None:
+            return await load()
+        call = asyncio.to_thread if self.shared else _call
+        value = await call(self.backend.get, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await load()
+        if value is not None:
+            await call(self.backend.set, key, value)
+        return value
+
+    def delete(self, *keys):
+        if self.backend is not None:
+            self.backend.delete(*keys)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+page_cache = Cache()
+
+#----------------------------------------------------------------------------#
+# Page keys.
+#----------------------------------------------------------------------------#
+
+def venue_key(venue_id):
+    return 'venue:{}'.format(venue_id)
+
+def artist_key(artist_id):
+    return 'artist:{}'.format(artist_id)
+
+# With a shared backend, edits run these as jobs: the handler clears the
+# edited page itself and `flask jobs work` clears the pages it appears on.
+# An in-process LRU can only be cleared by the process holding it, not by a
+# worker, so edits then call them directly.
+@job('cache.invalidate_venue')
+def invalidate_venue(venue_id):
+    page_cache.delete(*venue_pages(venue_id))
+
+@job('cache.invalidate_artist')
+def invalidate_artist(artist_id):
+    page_cache.delete(*artist_pages(artist_id))
+
+def venue_pages(venue_id):
+    # A venue's name and image also appear on the pages of its artists.
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    return [venue_key(venue_id)] + [artist_key(id) for id, in artist_ids]
+
+def artist_pages(artist_id):
+    # An artist's name and image also appear on the pages of its venues.
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return [artist_key(artist_id)] + [venue_key(id) for id, in venue_ids]
+
+def invalidate_show(show):
+    page_cache.delete(venue_key(show.venue_id), artist_key(show.artist_id))
+
+#----------------------------------------------------------------------------#
+# Fragments.
+#----------------------------------------------------------------------------#
+
+# {% cache key, ttl %}...{% endcache %} renders its body once and then serves
+# it from the cache backend for ttl seconds (CACHE_TTL when left out). Give
+# list tiles a key made of the entity ids and updated_at values they show:
+#
+#   {% cache ('venue', venue.id, venue.updated_at), 3600 %}
+#
+# so an edit changes the key and only the tiles that changed are rendered
+# again. Old keys are never read again and age out of the store.
+
+def fragment_key(key):
+    if isinstance(key, (tuple, list)):
+        key = ':'.join(str(part) for part in key)
+    return 'fragment:{}'.format(key)
+
+
+class FragmentCache(Cache):
+    # Cache of rendered template fragments, on its own backend so thousands
+    # of tiles do not push the detail pages out of the LRU.
+    def init_app(self, app):
+        super().init_app(app, maxsize=app.config.get('FRAGMENT_CACHE_MAXSIZE', 20000))
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+
+    def render(self, key, ttl, caller):
+        if self.backend is None:
+            return caller()
+        key = fragment_key(key)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return Markup(value)
+        self.misses += 1
+        value = caller()
+        self.backend.set(key, str(value), ttl)
+        return value
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.render(key, ttl, caller)
+
+
+fragment_cache = FragmentCache()
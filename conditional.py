@@ -0,0 +1,93 @@
+import hashlib
+from functools import wraps
+from flask import current_app, make_response, request, session
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def _set_cache_control(response):
+    max_age = current_app.config.get('HTTP_CACHE_MAX_AGE', 0)
+    response.cache_control.public = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+
+def _validate(values, last_modified):
+    # (etag, last_modified, whether the client's copy is still current)
+    etag = hashlib.sha1(repr((request.full_path, values)).encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (
+            last_modified is not None and request.if_modified_since is not None
+            and last_modified <= request.if_modified_since
+        )
+    return etag, last_modified, not_modified
+
+def _finish(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    _set_cache_control(response)
+    return response
+
+def _has_flashes():
+    # The session is only looked at when there is a session cookie, since
+    # touching it adds Vary: Cookie to otherwise public responses.
+    cookie = current_app.config['SESSION_COOKIE_NAME']
+    return cookie in request.cookies and '_flashes' in session
+
+def _uncacheable(result):
+    response = make_response(result)
+    response.cache_control.no_store = True
+    return response
+
+def conditional(validators):
+    # Decorates a read-only view with ETag and Last-Modified validators.
+    # validators(**view_args) returns (values, last_modified) as described in
+    # queries.py, or None to let the view handle a missing record. Requests
+    # whose validators still match get a 304 without the view running.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            if _has_flashes():
+                # the page carries one-off flash messages
+                return _uncacheable(view(**view_args))
+            found = validators(**view_args)
+            if found is None:
+                return view(**view_args)
+            etag, last_modified, not_modified = _validate(*found)
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(**view_args))
+            return _finish(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+def async_conditional(validators):
+    # conditional() for the async views in asgi.py: the view and validators
+    # are coroutines taking the same arguments. A view returning None hands
+    # the request to the WSGI app, which answers it conditionally itself.
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args):
+            if _has_flashes():
+                result = await view(*args)
+                return None if result is None else _uncacheable(result)
+            found = await validators(*args)
+            if found is None:
+                return await view(*args)
+            etag, last_modified, not_modified = _validate(*found)
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                result = await view(*args)
+                if result is None:
+                    return None
+                response = make_response(result)
+            return _finish(response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -1,5 +1,7 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Signs the session cookie, e.g. flash messages. Set it when running more
+# than one process, or each will reject the cookies of the others.
+SECRET_KEY = os.getenv('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -13,5 +15,106 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', '123456')
 DB_NAME = os.getenv('DB_NAME', 'postgres')
 DB_PORT = os.getenv('DB_PORT', '5432')
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://{}:{}@{}:{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME)
+# DATABASE_URL, as set by Heroku and most PaaS, overrides the DB_* settings
+SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or 'postgresql://{}:{}@{}:{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME)
+if SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
+    SQLALCHEMY_DATABASE_URI = 'postgresql://' + SQLALCHEMY_DATABASE_URI[len('postgres://'):]
+# Comma separated URLs of read replicas for the read-only pages. Clients keep
+# reading from the primary for REPLICA_LAG_WINDOW seconds after they write.
+SQLALCHEMY_REPLICA_URIS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+REPLICA_LAG_WINDOW = float(os.getenv('REPLICA_LAG_WINDOW', '5'))
+# Database URL for the async read path in asgi.py. Unset, it is derived from
+# SQLALCHEMY_DATABASE_URI with the asyncpg or aiosqlite driver.
+ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI')
+
+# Connection pool, per process. Checkouts wait up to DB_POOL_TIMEOUT seconds
+# once DB_POOL_SIZE + DB_MAX_OVERFLOW connections are in use. Connections
+# older than DB_POOL_RECYCLE seconds are replaced (-1: never); with
+# DB_POOL_PRE_PING each checkout first tests its connection. See /pool/stats.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() in ('1', 'true', 'yes')
+# Postgres statement_timeout in milliseconds, 0 for none
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', '0'))
+# Set when connecting through PgBouncer in transaction pooling mode
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() in ('1', 'true', 'yes')
+
+# Maximum number of rows returned per page by the search endpoints
+SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', '20'))
+# Name search backend: 'trigram' (Postgres pg_trgm), 'fts5' (SQLite), 'like',
+# or 'auto' to pick from the database dialect
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+# Number of shows per page on /shows
+SHOWS_PAGE_SIZE = int(os.getenv('SHOWS_PAGE_SIZE', '60'))
+
+# Cache for the venue and artist detail pages: 'none' (the default), 'redis'
+# (shared, at CACHE_REDIS_URL, needs the redis package) or 'lru'. An edit
+# only clears the LRU of the process that handled it, so 'lru' is for a
+# single process only; other workers would keep serving the old page. With
+# 'redis', edits leave clearing the pages a venue or artist appears on to a
+# job, so `flask jobs work` must be running.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'none')
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+# A client object to use instead of connecting to CACHE_REDIS_URL: anything
+# with redis-py's get/set/delete, e.g. a stand-in in tests
+CACHE_REDIS_CLIENT = None
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))
+CACHE_MAXSIZE = int(os.getenv('CACHE_MAXSIZE', '1024'))
+# {% cache %} template fragments share CACHE_BACKEND and CACHE_TTL, but keep
+# their own LRU: a list page can have thousands of tiles.
+FRAGMENT_CACHE_MAXSIZE = int(os.getenv('FRAGMENT_CACHE_MAXSIZE', '20000'))
+
+# Cache-Control max-age for the list and detail pages. 0 makes clients and
+# CDNs revalidate every time, which is cheap thanks to ETag / Last-Modified.
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '0'))
+
+# /shows?upcoming=1 reads the UpcomingShow read model while its last
+# `flask upcoming refresh` is at most this many seconds old; 0 never does
+UPCOMING_SHOWS_MAX_STALENESS = int(os.getenv('UPCOMING_SHOWS_MAX_STALENESS', '60'))
+
+# Background jobs, run by `flask jobs work` in JOBS_PROCESSES processes that
+# each claim JOBS_BATCH_SIZE due jobs at a time, leased for JOBS_LEASE
+# seconds, and look again every JOBS_POLL_INTERVAL seconds when none are due.
+# A failed job is retried after JOBS_RETRY_BACKOFF seconds, doubling up to
+# JOBS_RETRY_BACKOFF_MAX, until it has been tried JOBS_MAX_ATTEMPTS times.
+JOBS_PROCESSES = int(os.getenv('JOBS_PROCESSES', '2'))
+JOBS_BATCH_SIZE = int(os.getenv('JOBS_BATCH_SIZE', '5'))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1.0'))
+JOBS_LEASE = int(os.getenv('JOBS_LEASE', '300'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '5'))
+JOBS_RETRY_BACKOFF = float(os.getenv('JOBS_RETRY_BACKOFF', '10'))
+JOBS_RETRY_BACKOFF_MAX = float(os.getenv('JOBS_RETRY_BACKOFF_MAX', '3600'))
+
+# JSON API page sizes: the default and the largest ?limit= honoured
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '100'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '1000'))
+# JSON API responses smaller than this many bytes are sent uncompressed
+API_COMPRESS_MIN_SIZE = int(os.getenv('API_COMPRESS_MIN_SIZE', '1024'))
+
+# Request, database and template timings plus pool gauges at /metrics, in
+# the Prometheus text format
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# JSON log lines written from a background thread when not in debug mode:
+# to LOG_FILE (rotated once it reaches LOG_MAX_BYTES, keeping
+# LOG_BACKUP_COUNT old files) or to stderr if LOG_FILE is empty. Only
+# LOG_INFO_SAMPLE_RATE of the requests get their INFO records, access log
+# included, written; warnings and errors are always kept.
+LOG_FILE = os.getenv('LOG_FILE', 'error.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', '1.0'))
+
+# Per-request SQL profiling: X-Query-Count / X-Query-Time / Server-Timing
+# headers, a warning for any SELECT repeated PROFILER_N_PLUS_ONE_THRESHOLD
+# times in one request, and a per-route summary printed (and written to
+# PROFILER_REPORT, if set) when the process exits. PROFILER_PANEL also adds
+# a panel listing the statements to every HTML page.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILER_PANEL = os.getenv('PROFILER_PANEL', 'false').lower() in ('1', 'true', 'yes')
+PROFILER_N_PLUS_ONE_THRESHOLD = int(os.getenv('PROFILER_N_PLUS_ONE_THRESHOLD', '5'))
+PROFILER_REPORT = os.getenv('PROFILER_REPORT')
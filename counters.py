@@ -0,0 +1,80 @@
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, case, func, select, update
+from models import db, Venue, Artist, Show
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_show_count and Artist.upcoming_show_count are incremented
+# and decremented by the Show insert/delete events in models.py. A show stays
+# counted until rollover() finds it has started, so the counters lag by at
+# most the interval the rollover job runs at.
+
+SHOW_KEYS = (
+    (Venue, Show.venue_id),
+    (Artist, Show.artist_id),
+)
+
+def rollover(current_time=None):
+    # Uncounts every counted show that has started since the last rollover.
+    # Returns the number of shows moved into the past.
+    if current_time is None:
+        current_time = datetime.now()
+    started = and_(Show.counted_upcoming, Show.start_time <= current_time)
+    for model, show_key in SHOW_KEYS:
+        num_started = select(func.count(Show.id)) \
+            .where(started, show_key == model.id) \
+            .scalar_subquery()
+        db.session.execute(
+            update(model)
+            .where(model.id.in_(select(show_key).where(started)))
+            .values(upcoming_show_count=model.upcoming_show_count - num_started)
+        )
+    result = db.session.execute(update(Show).where(started).values(counted_upcoming=False))
+    db.session.commit()
+    return result.rowcount
+
+def reconcile(current_time=None):
+    # Rebuilds every counter from the Show table. Returns the drift found as
+    # (table, id, stored count, actual count) tuples.
+    if current_time is None:
+        current_time = datetime.now()
+    drift = []
+    for model, show_key in SHOW_KEYS:
+        actual = func.count(case((Show.start_time > current_time, Show.id)))
+        rows = db.session.query(model.id, model.upcoming_show_count, actual) \
+            .outerjoin(Show, show_key == model.id) \
+            .group_by(model.id) \
+            .having(model.upcoming_show_count != actual) \
+            .all()
+        drift.extend((model.__tablename__, id, stored, count) for id, stored, count in rows)
+
+    db.session.execute(update(Show).values(counted_upcoming=Show.start_time > current_time))
+    for model, show_key in SHOW_KEYS:
+        counted = select(func.count(Show.id)) \
+            .where(Show.counted_upcoming, show_key == model.id) \
+            .scalar_subquery()
+        db.session.execute(update(model).values(upcoming_show_count=counted))
+    db.session.commit()
+    return drift
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the upcoming show counters.')
+
+@counters_cli.command('rollover')
+def rollover_command():
+    """Uncount shows that have started. Run this periodically, e.g. from cron."""
+    click.echo('{} shows moved into the past'.format(rollover()))
+
+@counters_cli.command('reconcile')
+def reconcile_command():
+    """Rebuild the counters from scratch and report any drift."""
+    drift = reconcile()
+    for table, id, stored, actual in drift:
+        click.echo('{} {}: stored {}, actual {}'.format(table, id, stored, actual))
+    click.echo('{} counters drifted'.format(len(drift)))
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+import babel.dates
+import dateutil.parser
+from babel import Locale
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# The `datetime` template filter. Formats are resolved to a compiled Babel
+# pattern and locale once, and each (datetime, format, locale) is formatted
+# once: a page of shows repeats the same few start times across its tiles.
+# Output matches babel.dates.format_datetime.
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# babel's own CLDR formats, used when FORMATS has no pattern of the name
+NAMED_FORMATS = ('full', 'long', 'medium', 'short')
+
+# distinct (datetime, format, locale) kept formatted
+MEMO_SIZE = 16384
+
+def as_datetime(value):
+    # Datetimes pass through; strings, e.g. from JSON, are parsed.
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+@lru_cache(maxsize=None)
+def formatter(format='medium', locale='en'):
+    # A function formatting an aware datetime as `format` in `locale`.
+    locale = Locale.parse(locale)
+    if format not in FORMATS and format in NAMED_FORMATS:
+        return lambda value: babel.dates.format_datetime(value, format, locale=locale)
+    pattern = babel.dates.parse_pattern(FORMATS.get(format, format))
+    return lambda value: pattern.apply(value, locale)
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _format(value, format, locale):
+    # like babel, naive datetimes are taken to be UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return formatter(format, locale)(value)
+
+def format_datetime(value, format='medium', locale='en'):
+    return _format(as_datetime(value), format, locale)
+
+def format_datetimes(values, format='medium', locale='en'):
+    # format_datetime over a whole column, formatting each distinct value once
+    # and skipping the per-value memo lookups.
+    format_one = formatter(format, locale)
+    formatted = {}
+    results = []
+    for value in values:
+        text = formatted.get(value)
+        if text is None:
+            aware = as_datetime(value)
+            if aware.tzinfo is None:
+                aware = aware.replace(tzinfo=timezone.utc)
+            text = formatted[value] = format_one(aware)
+        results.append(text)
+    return results
@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from models import db, Venue, Artist, Show
+from queries import GENRE_LINKS, genre_names
+#----------------------------------------------------------------------------#
+# Sources.
+#----------------------------------------------------------------------------#
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+# bookkeeping columns that are not part of the catalogue
+INTERNAL_COLUMNS = {'counted_upcoming'}
+
+def export_columns(entity):
+    model = MODELS[entity]
+    columns = [column for column in model.__table__.columns if column.name not in INTERNAL_COLUMNS]
+    if model in GENRE_LINKS:
+        # joined with ';', the same way `flask import` reads them
+        columns.append(genre_names(model).label('genres'))
+    return columns
+
+def batches(entity, batch_size=1000):
+    # Yields lists of row tuples read from a server side cursor, so only one
+    # batch is held in memory at a time.
+    model = MODELS[entity]
+    result = db.session.execute(
+        select(*export_columns(entity))
+        .order_by(model.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        yield partition
+
+#----------------------------------------------------------------------------#
+# Formats.
+#----------------------------------------------------------------------------#
+
+# Each format turns (column names, batches) into chunks of bytes.
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(value)
+
+def write_csv(names, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def write_jsonl(names, batches):
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(names, row)), default=_json_default) + '\n' for row in batch
+        ).encode()
+
+
+class _Chunks(io.RawIOBase):
+    # Write-only sink collecting what the Parquet writer produces until the
+    # next chunk is taken.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def write_parquet(names, batches, columns):
+    # One Parquet row group per batch. Needs the optional pyarrow package,
+    # imported here rather than in the generator so a missing package raises
+    # ImportError before anything has been sent.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {
+        'INTEGER': pa.int64(),
+        'BOOLEAN': pa.bool_(),
+        'DATETIME': pa.timestamp('us'),
+    }
+    schema = pa.schema([
+        (column.name, types.get(column.type.__visit_name__.upper(), pa.string()))
+        for column in columns
+    ])
+    return _parquet_chunks(pa, pq, names, batches, schema)
+
+def _parquet_chunks(pa, pq, names, batches, schema):
+    sink = _Chunks()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        writer.write_table(pa.Table.from_pylist([dict(zip(names, row)) for row in batch], schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def export(entity, format, batch_size=1000):
+    # Streams the whole table for entity in format as chunks of bytes.
+    columns = export_columns(entity)
+    names = [column.name for column in columns]
+    rows = batches(entity, batch_size)
+    if format == 'csv':
+        return write_csv(names, rows)
+    if format == 'jsonl':
+        return write_jsonl(names, rows)
+    if format == 'parquet':
+        return write_parquet(names, rows, columns)
+    raise ValueError(format)
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(list(MODELS)))
+@click.argument('format', type=click.Choice(list(FORMATS)))
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='Defaults to stdout.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+@with_appcontext
+def export_command(entity, format, output, batch_size):
+    """Export every venue, artist or show as csv, jsonl or parquet."""
+    try:
+        chunks = export(entity, format, batch_size)
+    except ImportError as e:
+        raise click.ClickException('{} export needs the {} package'.format(format, e.name))
+    out = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
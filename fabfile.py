@@ -1,14 +1,27 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
 # prepare for deployment
 
 
-def test():
+BASELINE = "benchmarks/baselines/1k.json"
+
+
+def test(save_baseline=False):
+    # the test suite, then the view benchmarks on a throwaway database,
+    # which fail on a regression against this machine's baseline, and also
+    # when there is none: record one with `fab test:save_baseline=yes`.
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m pytest -q tests")
+        if result.succeeded:
+            if save_baseline:
+                result = local("python -m benchmarks.views --scale 1k --save-baseline")
+            else:
+                if not os.path.exists(BASELINE):
+                    print("No benchmark baseline at {}; run `fab test:save_baseline=yes` "
+                          "on this machine to record one.".format(BASELINE))
+                result = local("python -m benchmarks.views --scale 1k")
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,9 +52,10 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # smoke test of the deployed release: its pages answer without errors
+    url = local("heroku info -s | grep ^web_url= | cut -d= -f2", capture=True).rstrip("/")
+    for path in ("/", "/venues", "/artists", "/shows"):
+        local("curl --fail --silent --show-error --output /dev/null {}{}".format(url, path))
 
 
 def deploy():
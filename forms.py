@@ -1,8 +1,20 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, NumberRange, Optional
 import re
+from models import db, Genre, SHOW_DURATION, MAX_SHOW_DURATION
+from cache import LRUBackend
+
+_genres = LRUBackend(maxsize=1, ttl=300)
+
+def genre_choices():
+    # genre choices come from the Genre table, cached for five minutes
+    choices = _genres.get('choices')
+    if choices is None:
+        choices = [(name, name) for name, in db.session.query(Genre.name).order_by(Genre.id)]
+        _genres.set('choices', choices)
+    return choices
 
 def validate_phone(form, field):
     regex = re.compile('^([0-9]{3})[-][0-9]{3}[-][0-9]{4}$')
@@ -10,18 +22,33 @@ def validate_phone(form, field):
     if not isMatch:
         raise ValidationError('Error, phone number must be in format xxx-xxx-xxxx')
 
+def validate_id(form, field):
+    if not (field.data or '').strip().isdigit():
+        raise ValidationError('Error, {} must be a number'.format(field.name))
+
 class ShowForm(Form):
     artist_id = StringField(
-        'artist_id'
+        'artist_id', validators=[validate_id]
     )
     venue_id = StringField(
-        'venue_id'
+        'venue_id', validators=[validate_id]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # minutes; SHOW_DURATION when left empty
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_DURATION // timedelta(minutes=1))],
+        default=SHOW_DURATION // timedelta(minutes=1)
+    )
+
+    def end_time(self):
+        if self.duration.data is None:
+            return self.start_time.data + SHOW_DURATION
+        return self.start_time.data + timedelta(minutes=self.duration.data)
 
 class VenueForm(Form):
     name = StringField(
@@ -98,29 +125,8 @@ class VenueForm(Form):
         'image_link'
     )
     genres = SelectMultipleField(
-        # TODO implement enum restriction
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=genre_choices
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -209,27 +215,7 @@ class ArtistForm(Form):
     )
     genres = SelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=genre_choices
      )
     facebook_link = StringField(
         # TODO implement enum restriction
@@ -0,0 +1,310 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, func, insert, select, update
+from werkzeug.datastructures import MultiDict
+from models import db, Genre, Venue, Artist, Show
+from queries import GENRE_LINKS
+from forms import VenueForm, ArtistForm, ShowForm
+from cache import page_cache, venue_key, artist_key
+from scheduling import BatchChecker, lock_schedule
+#----------------------------------------------------------------------------#
+# Readers and writers.
+#----------------------------------------------------------------------------#
+
+def read_rows(path):
+    # Streams dicts from a .csv file (one column per field, multiple genres
+    # separated by ';') or a .jsonl file (one object per line).
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                if row.get('genres'):
+                    row['genres'] = row['genres'].split(';')
+                yield row
+
+
+def read_fieldnames(path, entity):
+    # The columns of a .csv file, or for .jsonl the fields the import reads.
+    if path.endswith('.jsonl'):
+        return ['id'] + form_field_names(ENTITIES[entity][1])
+    with open(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+class RejectWriter:
+    # Writes rejected rows, each with an `error` field, in the input format.
+    # A .csv file has the given columns plus `error`.
+    def __init__(self, path, fieldnames=()):
+        self.path = path
+        self.fieldnames = [name for name in fieldnames if name != 'error'] + ['error']
+        self.count = 0
+        self._file = None
+        self._csv = None
+
+    def write(self, row, error):
+        if self._file is None:
+            self._file = open(self.path, 'w', newline='')
+        self.count += 1
+        row = dict(row, error=error)
+        if self.path.endswith('.jsonl'):
+            self._file.write(json.dumps(row, default=str) + '\n')
+            return
+        if isinstance(row.get('genres'), list):
+            row['genres'] = ';'.join(row['genres'])
+        if self._csv is None:
+            self._csv = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+            self._csv.writeheader()
+        self._csv.writerow(row)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+#----------------------------------------------------------------------------#
+# Validation.
+#----------------------------------------------------------------------------#
+
+_field_names = {}
+
+def form_field_names(form_class):
+    if form_class not in _field_names:
+        _field_names[form_class] = [field.name for field in form_class(meta={'csrf': False}, formdata=MultiDict())]
+    return _field_names[form_class]
+
+def validate(form_class, row):
+    # Runs a row through the same WTForms form as the create pages. Returns
+    # (form, None) or (None, error message).
+    formdata = MultiDict()
+    for name in form_field_names(form_class):
+        value = row.get(name)
+        if isinstance(value, list):
+            formdata.setlist(name, [str(item) for item in value])
+        elif isinstance(value, bool):
+            formdata[name] = 'y' if value else ''
+        else:
+            formdata[name] = '' if value is None else str(value)
+    form = form_class(meta={'csrf': False}, formdata=formdata)
+    if form.validate():
+        return form, None
+    return None, '; '.join(
+        '{}: {}'.format(field, ' '.join(errors)) for field, errors in form.errors.items()
+    )
+
+def venue_values(form):
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "address": form.address.data,
+        "phone": form.phone.data,
+        "image_link": form.image_link.data,
+        "facebook_link": form.facebook_link.data,
+        "genres": form.genres.data,
+        "website_link": form.website_link.data,
+        "seeking_talent": form.seeking_talent.data,
+        "seeking_description": form.seeking_description.data,
+    }
+
+def artist_values(form):
+    return {
+        "name": form.name.data,
+        "genres": form.genres.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "phone": form.phone.data,
+        "website_link": form.website_link.data,
+        "facebook_link": form.facebook_link.data,
+        "seeking_venue": form.seeking_venue.data,
+        "seeking_description": form.seeking_description.data,
+        "image_link": form.image_link.data,
+    }
+
+def show_values(form):
+    return {
+        "artist_id": int(form.artist_id.data),
+        "venue_id": int(form.venue_id.data),
+        "start_time": form.start_time.data,
+        "end_time": form.end_time(),
+    }
+
+ENTITIES = {
+    'venues': (Venue, VenueForm, venue_values),
+    'artists': (Artist, ArtistForm, artist_values),
+    'shows': (Show, ShowForm, show_values),
+}
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+def _existing_ids(model, ids):
+    return {id for id, in db.session.execute(select(model.id).where(model.id.in_(ids)))}
+
+def _check_show_references(batch):
+    # Drops shows pointing at unknown venues or artists from the batch.
+    venue_ids = _existing_ids(Venue, {values["venue_id"] for _, values in batch})
+    artist_ids = _existing_ids(Artist, {values["artist_id"] for _, values in batch})
+    valid, rejected = [], []
+    for row, values in batch:
+        if values["venue_id"] not in venue_ids:
+            rejected.append((row, 'venue_id: no venue {}'.format(values["venue_id"])))
+        elif values["artist_id"] not in artist_ids:
+            rejected.append((row, 'artist_id: no artist {}'.format(values["artist_id"])))
+        else:
+            valid.append((row, values))
+    return valid, rejected
+
+def _check_show_conflicts(batch):
+    # Drops shows double booking a venue or an artist, whether with shows
+    # already stored or earlier ones in the batch.
+    checker = BatchChecker([values for _, values in batch])
+    valid, rejected = [], []
+    for row, values in batch:
+        error = checker.check(values)
+        if error:
+            rejected.append((row, error))
+        else:
+            valid.append((row, values))
+    return valid, rejected
+
+def _count_upcoming_shows(values, current_time):
+    # Core inserts skip the Show events in models.py, so the upcoming show
+    # counters are maintained here with one executemany per table.
+    for show in values:
+        show["counted_upcoming"] = show["start_time"] > current_time
+    connection = db.session.connection()
+    for model, key in ((Venue, "venue_id"), (Artist, "artist_id")):
+        counts = Counter(show[key] for show in values if show["counted_upcoming"])
+        if counts:
+            connection.execute(
+                update(model)
+                .where(model.id == bindparam('b_id'))
+                .values(upcoming_show_count=model.upcoming_show_count + bindparam('b_delta')),
+                [{"b_id": id, "b_delta": delta} for id, delta in counts.items()]
+            )
+
+def _insert_with_genres(model, values):
+    # Inserts venues or artists, then links them to their genres using the
+    # ids RETURNING gives back in parameter order.
+    genres = [row.pop("genres") for row in values]
+    ids = db.session.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), values
+    ).scalars().all()
+    genre_ids = dict(db.session.query(Genre.name, Genre.id))
+    link = GENRE_LINKS[model]
+    links = [
+        {link.name: id, "genre_id": genre_ids[name]}
+        for id, names in zip(ids, genres)
+        for name in set(names)
+    ]
+    if links:
+        db.session.execute(insert(link.table), links)
+
+def _flush(model, batch, rejects):
+    # Inserts one validated batch in its own transaction. If the insert fails
+    # the whole batch is rejected with the database error.
+    if model is Show:
+        # held until the batch commits, so nothing is booked in between
+        lock_schedule()
+        batch, rejected = _check_show_references(batch)
+        for row, error in rejected:
+            rejects.write(row, error)
+        batch, rejected = _check_show_conflicts(batch)
+        for row, error in rejected:
+            rejects.write(row, error)
+    if not batch:
+        db.session.rollback()
+        return 0
+    values = [values for _, values in batch]
+    try:
+        if model is Show:
+            _count_upcoming_shows(values, datetime.now())
+            db.session.execute(insert(model), values)
+        else:
+            _insert_with_genres(model, values)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for row, _ in batch:
+            # the driver's message, e.g. which constraint failed, without the SQL
+            rejects.write(row, 'database: {}'.format(getattr(e, 'orig', None) or e))
+        return 0
+    if model is Show:
+        page_cache.delete(*{venue_key(show["venue_id"]) for show in values})
+        page_cache.delete(*{artist_key(show["artist_id"]) for show in values})
+    return len(batch)
+
+def _reset_sequence(model):
+    # Rows imported with explicit ids leave the Postgres id sequence behind.
+    if db.engine.dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(select(func.setval(
+            func.pg_get_serial_sequence('"{}"'.format(table), 'id'),
+            select(func.coalesce(func.max(model.id), 1)).scalar_subquery(),
+        )))
+        db.session.commit()
+
+def import_rows(entity, rows, batch_size, rejects):
+    # Validates and inserts rows in batches. Returns (rows read, rows inserted).
+    model, form_class, to_values = ENTITIES[entity]
+    read = inserted = 0
+    explicit_ids = False
+    batch = []
+    for row in rows:
+        read += 1
+        form, error = validate(form_class, row)
+        if error:
+            rejects.write(row, error)
+            continue
+        try:
+            values = to_values(form)
+            if row.get('id') not in (None, ''):
+                values["id"] = int(row['id'])
+                explicit_ids = True
+        except ValueError as e:
+            rejects.write(row, str(e))
+            continue
+        batch.append((row, values))
+        if len(batch) >= batch_size:
+            inserted += _flush(model, batch, rejects)
+            batch = []
+    inserted += _flush(model, batch, rejects)
+    if explicit_ids:
+        _reset_sequence(model)
+    return read, inserted
+
+@click.command('import')
+@click.argument('entity', type=click.Choice(list(ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT and transaction.')
+@click.option('--rejects', 'rejects_path', help='Where to write rejected rows. Defaults to PATH.rejects.csv/.jsonl.')
+@with_appcontext
+def import_command(entity, path, batch_size, rejects_path):
+    """Bulk load venues, artists or shows from a .csv or .jsonl file.
+
+    Rows are validated with the same forms as the create pages. Invalid rows
+    are written to a rejects file instead of aborting the import.
+    """
+    if rejects_path is None:
+        base, ext = os.path.splitext(path)
+        rejects_path = '{}.rejects{}'.format(base, ext if ext == '.jsonl' else '.csv')
+    rejects = RejectWriter(rejects_path, read_fieldnames(path, entity))
+    start = time.perf_counter()
+    try:
+        read, inserted = import_rows(entity, read_rows(path), batch_size, rejects)
+    finally:
+        rejects.close()
+    elapsed = time.perf_counter() - start
+    click.echo('{} {}: {} read, {} inserted, {} rejected in {:.1f}s ({:.0f} rows/s)'.format(
+        entity, path, read, inserted, rejects.count, elapsed, read / elapsed if elapsed else 0))
+    if rejects.count:
+        click.echo('rejected rows written to {}'.format(rejects_path))
@@ -0,0 +1,230 @@
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import traceback
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup, locate_app
+from sqlalchemy import case, delete, func, or_, select, update
+from models import db, Job, utcnow
+#----------------------------------------------------------------------------#
+# Queue.
+#----------------------------------------------------------------------------#
+
+# Request handlers defer work by adding a Job row in the same transaction as
+# their own changes, so a job is queued exactly when the change commits:
+#
+#   enqueue(invalidate_venue, venue_id=venue.id)
+#   db.session.commit()
+#
+# `flask jobs work` runs them in a pool of worker processes. Workers claim
+# due jobs with UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED),
+# so they never wait on each other; SQLite has no row locks, but runs the
+# single UPDATE under its database write lock instead. A claim is a lease of
+# JOBS_LEASE seconds: if the worker dies, the job is claimed again once the
+# lease runs out. Jobs can therefore run more than once and must be
+# idempotent. Failed jobs are retried with exponential backoff, up to their
+# max_attempts.
+
+log = logging.getLogger(__name__)
+
+# job name -> function
+JOBS = {}
+
+def job(name, max_attempts=None):
+    # Registers fn as a job under `name`, which is stored in the queue and so
+    # must stay the same across deploys.
+    def register(fn):
+        fn.job_name = name
+        fn.max_attempts = max_attempts
+        JOBS[name] = fn
+        return fn
+    return register
+
+def enqueue(fn, delay=0, unique=False, **args):
+    # Queues fn(**args) in the current session, to run after `delay` seconds
+    # once the session commits. With unique, nothing is queued while a run of
+    # fn is already waiting to be claimed. args must be JSON serializable.
+    if unique and db.session.scalar(waiting().where(Job.name == fn.job_name).limit(1)) is not None:
+        return None
+    queued = Job(
+        name=fn.job_name,
+        args=args,
+        run_at=utcnow() + timedelta(seconds=delay),
+        max_attempts=fn.max_attempts or current_app.config.get('JOBS_MAX_ATTEMPTS', 5),
+    )
+    db.session.add(queued)
+    return queued
+
+def waiting(current_time=None):
+    # Queued jobs no worker holds a lease on.
+    current_time = current_time or utcnow()
+    return select(Job.id).where(
+        Job.status == 'queued',
+        or_(Job.locked_until.is_(None), Job.locked_until < current_time),
+    )
+
+def claim(worker, limit=1):
+    # Leases up to `limit` due jobs to `worker`, counting an attempt for each.
+    # Returns (id, name, args, attempts, max_attempts) rows.
+    now = utcnow()
+    due = waiting(now).where(Job.run_at <= now) \
+        .order_by(Job.run_at, Job.id) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True)
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.id.in_(due))
+        .values(
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=current_app.config.get('JOBS_LEASE', 300)),
+            attempts=Job.attempts + 1,
+        )
+        .returning(Job.id, Job.name, Job.args, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(claimed)
+
+def backoff(attempts):
+    # Delay before retrying after the attempts-th failure: JOBS_RETRY_BACKOFF
+    # doubled for every earlier failure, capped at JOBS_RETRY_BACKOFF_MAX,
+    # with jitter so failed jobs do not all come back at once.
+    base = current_app.config.get('JOBS_RETRY_BACKOFF', 10)
+    delay = min(base * 2 ** (attempts - 1), current_app.config.get('JOBS_RETRY_BACKOFF_MAX', 3600))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+def run(worker, id, name, args, attempts, max_attempts):
+    # Runs one claimed job. Returns whether it succeeded.
+    try:
+        if attempts > max_attempts:
+            raise RuntimeError('lease expired on the last attempt')
+        if name not in JOBS:
+            raise LookupError('no job named {!r}'.format(name))
+        JOBS[name](**args)
+        # whatever the job left uncommitted commits with its removal
+        db.session.execute(delete(Job).where(Job.id == id, Job.locked_by == worker))
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        log.exception('job %s %s failed, attempt %s of %s', id, name, attempts, max_attempts)
+        values = {"locked_by": None, "locked_until": None, "last_error": traceback.format_exc()}
+        if attempts >= max_attempts:
+            values["status"] = 'failed'
+        else:
+            values["run_at"] = utcnow() + backoff(attempts)
+        db.session.execute(update(Job).where(Job.id == id, Job.locked_by == worker).values(values))
+        db.session.commit()
+        return False
+    finally:
+        db.session.remove()
+
+#----------------------------------------------------------------------------#
+# Workers.
+#----------------------------------------------------------------------------#
+
+def worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+def work(stop, batch_size=5, poll_interval=1.0, burst=False):
+    # Claims and runs jobs until `stop` is set, or with burst until none are
+    # due. Returns the number of jobs run.
+    worker = worker_name()
+    count = 0
+    while not stop.is_set():
+        claimed = claim(worker, batch_size)
+        for row in claimed:
+            run(worker, *row)
+            count += 1
+        if not claimed:
+            if burst:
+                break
+            stop.wait(poll_interval)
+    return count
+
+def _stop_on_signals(stop):
+    # The job being run is finished before stopping.
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+def _work_process(import_name, stop, batch_size, poll_interval, burst):
+    # Entry point of a pool process, which loads the app afresh: engines,
+    # pools and the log listener thread are not shared with the parent.
+    _stop_on_signals(stop)
+    with locate_app(import_name, None).app_context():
+        work(stop, batch_size, poll_interval, burst)
+
+def work_pool(processes, batch_size=5, poll_interval=1.0, burst=False):
+    # Runs `processes` workers and waits for them all to exit.
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    _stop_on_signals(stop)
+    pool = [
+        context.Process(
+            target=_work_process,
+            args=(current_app.import_name, stop, batch_size, poll_interval, burst),
+            name='fyyur-jobs-{}'.format(i),
+        )
+        for i in range(processes)
+    ]
+    for process in pool:
+        process.start()
+    for process in pool:
+        process.join()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+jobs_cli = AppGroup('jobs', help='Run and inspect the background job queue.')
+
+@jobs_cli.command('work')
+@click.option('--processes', type=int, help='Worker processes (default JOBS_PROCESSES).')
+@click.option('--batch-size', type=int, help='Jobs claimed at a time (default JOBS_BATCH_SIZE).')
+@click.option('--poll-interval', type=float, help='Seconds to wait when no job is due (default JOBS_POLL_INTERVAL).')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def work_command(processes, batch_size, poll_interval, burst):
+    """Run queued jobs until interrupted."""
+    config = current_app.config
+    processes = processes or config.get('JOBS_PROCESSES', 2)
+    batch_size = batch_size or config.get('JOBS_BATCH_SIZE', 5)
+    poll_interval = poll_interval or config.get('JOBS_POLL_INTERVAL', 1.0)
+    if processes == 1:
+        stop = threading.Event()
+        _stop_on_signals(stop)
+        click.echo('{} jobs run'.format(work(stop, batch_size, poll_interval, burst)))
+    else:
+        work_pool(processes, batch_size, poll_interval, burst)
+
+@jobs_cli.command('stats')
+def stats_command():
+    """Count jobs by name and state."""
+    now = utcnow()
+    state = case(
+        (Job.status == 'failed', 'failed'),
+        (Job.locked_until >= now, 'running'),
+        (Job.run_at > now, 'scheduled'),
+        else_='due',
+    )
+    rows = db.session.execute(
+        select(Job.name, state, func.count()).group_by(Job.name, state).order_by(Job.name, state)
+    )
+    for name, state, count in rows:
+        click.echo('{:<40} {:<10} {}'.format(name, state, count))
+
+@jobs_cli.command('retry')
+@click.argument('ids', nargs=-1, type=int)
+def retry_command(ids):
+    """Queue failed jobs again, all of them or those with the given IDS."""
+    query = update(Job).where(Job.status == 'failed')
+    if ids:
+        query = query.where(Job.id.in_(ids))
+    result = db.session.execute(query.values(status='queued', attempts=0, run_at=utcnow()))
+    db.session.commit()
+    click.echo('{} jobs queued again'.format(result.rowcount))
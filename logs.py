@@ -0,0 +1,150 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+from sqltimer import query_timer
+#----------------------------------------------------------------------------#
+# Records.
+#----------------------------------------------------------------------------#
+
+# Request threads only put records on a queue. A listener thread formats them
+# as JSON lines and writes them out, so slow disks never hold up a request.
+
+REQUEST_FIELDS = ('request_id', 'route', 'method', 'path', 'status', 'latency_ms', 'db_queries')
+
+
+class RequestFilter(logging.Filter):
+    # Adds the request id, route, latency so far and statement count so far
+    # (from sqltimer) to records logged while handling a request. Runs on the
+    # request thread.
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+            record.route = request.endpoint
+            record.method = request.method
+            record.path = request.path
+            if not hasattr(record, 'latency_ms'):
+                record.latency_ms = round((time.perf_counter() - g.request_start) * 1000, 3)
+            if not hasattr(record, 'db_queries'):
+                queries = query_timer.current()
+                record.db_queries = queries.count if queries else 0
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps `rate` of the records below WARNING. Records of one request are
+    # kept or dropped together.
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode()) % 10000 < self.rate * 10000
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in REQUEST_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    # Unlike QueueHandler.prepare() this keeps the traceback out of the
+    # message, so it ends up in its own JSON field.
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+#----------------------------------------------------------------------------#
+# Setup.
+#----------------------------------------------------------------------------#
+
+class LogPipeline:
+    # Sends every log record through a queue to LOG_FILE, rotated at
+    # LOG_MAX_BYTES and keeping LOG_BACKUP_COUNT files, or to stderr when
+    # LOG_FILE is empty. Logs one access record per request, sampled at
+    # LOG_INFO_SAMPLE_RATE like any other INFO record. Its db_queries leaves
+    # out what a streamed response runs while it is sent.
+    def __init__(self, app=None):
+        self.listener = None
+        self.access = logging.getLogger('fyyur.access')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('LOG_FILE'):
+            output = RotatingFileHandler(
+                app.config['LOG_FILE'],
+                maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                backupCount=app.config.get('LOG_BACKUP_COUNT', 5),
+            )
+        else:
+            output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JsonFormatter())
+
+        records = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        handler.addFilter(RequestFilter())
+        handler.addFilter(SamplingFilter(app.config.get('LOG_INFO_SAMPLE_RATE', 1.0)))
+        self.listener = QueueListener(records, output, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+        root = logging.getLogger()
+        root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+        root.addHandler(handler)
+        query_timer.init_app(app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def close(self):
+        # Writes out the records still queued and stops the listener thread.
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _start(self):
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+
+    def _finish(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+            self.access.info('%s %s %s', request.method, request.full_path.rstrip('?'), response.status_code,
+                             extra={"status": response.status_code})
+        return response
+
+
+log_pipeline = LogPipeline()
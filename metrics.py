@@ -0,0 +1,206 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+from flask import before_render_template, g, got_request_exception, request, template_rendered
+from sqlalchemy.pool import QueuePool
+from pool import TimedQueuePool
+from sqltimer import query_timer
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+# Every thread records into a shard of its own, so recording takes no lock.
+# Shards are merged when /metrics is scraped. When a thread exits, its shard
+# is folded into a retired one, so threads that come and go, e.g. under a
+# server starting a thread per request, do not leave shards behind.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        # (name, labels) -> [count per bucket..., count above the last, sum]
+        self.histograms = {}
+
+    def merge(self, other):
+        for key, value in other.counters.copy().items():
+            self.counters[key] += value
+        for key, observations in other.histograms.copy().items():
+            merged = self.histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+            for i, value in enumerate(list(observations)):
+                merged[i] += value
+
+
+class _Owner:
+    # Held only by the thread's locals, so it is collected when the thread
+    # exits.
+    pass
+
+
+class Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            self._local.owner = _Owner()
+            weakref.finalize(self._local.owner, self._retire, shard)
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.remove(shard)
+            self._retired.merge(shard)
+
+    def inc(self, name, labels, value=1):
+        self._shard().counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        observations = histograms.get(key)
+        if observations is None:
+            observations = histograms[key] = [0] * (len(BUCKETS) + 2)
+        observations[bisect_left(BUCKETS, value)] += 1
+        observations[-1] += value
+
+    def collect(self):
+        # Merged (counters, histograms) of every shard.
+        merged = _Shard()
+        # under the lock, so no shard is retired while it is being counted
+        with self._lock:
+            merged.merge(self._retired)
+            for shard in self._shards:
+                merged.merge(shard)
+        return merged.counters, merged.histograms
+
+#----------------------------------------------------------------------------#
+# Exposition.
+#----------------------------------------------------------------------------#
+
+HELP = {
+    'fyyur_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'fyyur_request_exceptions_total': ('counter', 'Unhandled exceptions, by endpoint and exception type.'),
+    'fyyur_db_queries_total': ('counter', 'SQL statements run while handling requests, by endpoint.'),
+    'fyyur_request_duration_seconds': ('histogram', 'Time to handle a request, by endpoint.'),
+    'fyyur_request_db_seconds': ('histogram', 'Time spent in the database per request, by endpoint.'),
+    'fyyur_request_render_seconds': ('histogram', 'Time spent rendering templates per request, by endpoint.'),
+    'fyyur_db_pool_connections': ('gauge', 'Pooled database connections, by bind and state.'),
+    'fyyur_db_pool_checkouts_total': ('counter', 'Connections checked out, by bind.'),
+    'fyyur_db_pool_timeouts_total': ('counter', 'Checkouts that timed out waiting for a connection, by bind.'),
+    'fyyur_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a pooled connection, by bind.'),
+}
+
+def _series(name, labels, extra=''):
+    # name{label="value",...}, labels being a tuple of (name, value) pairs
+    pairs = ['{}="{}"'.format(label, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+             for label, value in labels]
+    if extra:
+        pairs.append(extra)
+    return '{}{{{}}}'.format(name, ','.join(pairs)) if pairs else name
+
+def render(counters, histograms, gauges):
+    # Prometheus text format.
+    families = defaultdict(list)
+    for (name, labels), value in sorted(list(counters.items()) + list(gauges.items())):
+        families[name].append('{} {}'.format(_series(name, labels), value))
+    for (name, labels), observations in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, observations):
+            cumulative += count
+            families[name].append('{} {}'.format(_series(name + '_bucket', labels, 'le="{}"'.format(bound)), cumulative))
+        total = cumulative + observations[len(BUCKETS)]
+        families[name].append('{} {}'.format(_series(name + '_bucket', labels, 'le="+Inf"'), total))
+        families[name].append('{} {}'.format(_series(name + '_sum', labels), observations[-1]))
+        families[name].append('{} {}'.format(_series(name + '_count', labels), total))
+    lines = []
+    for name in sorted(families):
+        kind, help = HELP.get(name, ('untyped', ''))
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        lines.extend(families[name])
+    return '\n'.join(lines) + '\n'
+
+def pool_gauges(engines):
+    gauges = {}
+    for bind, engine in engines.items():
+        pool = engine.pool
+        bind = (('bind', bind or 'primary'),)
+        if isinstance(pool, QueuePool):
+            for state, value in (('idle', pool.checkedin()), ('in_use', pool.checkedout()), ('overflow', pool.overflow())):
+                gauges[('fyyur_db_pool_connections', bind + (('state', state),))] = value
+        if isinstance(pool, TimedQueuePool):
+            gauges[('fyyur_db_pool_checkouts_total', bind)] = pool.stats.checkouts
+            gauges[('fyyur_db_pool_timeouts_total', bind)] = pool.stats.timeouts
+            gauges[('fyyur_db_pool_wait_seconds_total', bind)] = pool.stats.wait_total
+    return gauges
+
+#----------------------------------------------------------------------------#
+# Instrumentation.
+#----------------------------------------------------------------------------#
+
+class Metrics:
+    # Times every request, the SQL it runs (as timed by sqltimer) and the
+    # templates it renders. Statements a streamed response runs while it is
+    # sent are not counted.
+    def __init__(self, app=None):
+        self.registry = Registry()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        got_request_exception.connect(self._exception, app)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+        query_timer.init_app(app)
+
+    def _start(self):
+        g.metrics = {"start": time.perf_counter(), "render": 0.0, "render_start": []}
+
+    def _finish(self, response):
+        timings = g.pop('metrics', None)
+        if timings is None:
+            return response
+        queries = query_timer.current()
+        endpoint = (('endpoint', request.endpoint or 'unmatched'),)
+        self.registry.inc('fyyur_requests_total', endpoint + (('method', request.method), ('status', response.status_code)))
+        self.registry.inc('fyyur_db_queries_total', endpoint, queries.count if queries else 0)
+        self.registry.observe('fyyur_request_duration_seconds', endpoint, time.perf_counter() - timings["start"])
+        self.registry.observe('fyyur_request_db_seconds', endpoint, queries.seconds if queries else 0.0)
+        self.registry.observe('fyyur_request_render_seconds', endpoint, timings["render"])
+        return response
+
+    def _exception(self, sender, exception, **extra):
+        self.registry.inc('fyyur_request_exceptions_total', (
+            ('endpoint', request.endpoint or 'unmatched'), ('exception', type(exception).__name__)))
+
+    def _before_render(self, sender, template, context, **extra):
+        timings = g.get('metrics')
+        if timings is not None:
+            timings["render_start"].append(time.perf_counter())
+
+    def _rendered(self, sender, template, context, **extra):
+        timings = g.get('metrics')
+        if timings is not None and timings["render_start"]:
+            timings["render"] += time.perf_counter() - timings["render_start"].pop()
+
+    def exposition(self, engines):
+        counters, histograms = self.registry.collect()
+        return render(counters, histograms, pool_gauges(engines))
+
+
+metrics = Metrics()
@@ -0,0 +1,71 @@
+"""upcoming show read model
+
+Revision ID: 044cee2bea93
+Revises: 3cee7c613391
+Create Date: 2026-10-18 20:05:31.884120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '044cee2bea93'
+down_revision = '3cee7c613391'
+branch_labels = None
+depends_on = None
+
+# (index, columns) on UpcomingShow
+INDEXES = [
+    ('ix_UpcomingShow_start_time_id', ['start_time', 'id']),
+    ('ix_UpcomingShow_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_UpcomingShow_artist_id_start_time', ['artist_id', 'start_time']),
+]
+
+
+def upgrade():
+    op.create_table('ReadModelRefresh',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Keeps a day of past shows, so a database clock in another time zone
+        # than the app's cannot drop shows the app still calls upcoming;
+        # readers filter on start_time anyway. REFRESH ... CONCURRENTLY needs
+        # the unique index on id.
+        op.execute('''
+            CREATE MATERIALIZED VIEW "UpcomingShow" AS
+            SELECT s.id, s.start_time, s.end_time,
+                   s.venue_id, v.name AS venue_name, v.image_link AS venue_image_link,
+                   s.artist_id, a.name AS artist_name, a.image_link AS artist_image_link
+            FROM "Show" s
+            JOIN "Venue" v ON v.id = s.venue_id
+            JOIN "Artist" a ON a.id = s.artist_id
+            WHERE s.start_time > LOCALTIMESTAMP - interval '1 day'
+        ''')
+        op.create_index('ix_UpcomingShow_id', 'UpcomingShow', ['id'], unique=True)
+    else:
+        op.create_table('UpcomingShow',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('venue_name', sa.String(), nullable=True),
+        sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('artist_name', sa.String(), nullable=True),
+        sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    for name, columns in INDEXES:
+        op.create_index(name, 'UpcomingShow', columns, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP MATERIALIZED VIEW "UpcomingShow"')
+    else:
+        op.drop_table('UpcomingShow')
+    op.drop_table('ReadModelRefresh')
@@ -0,0 +1,66 @@
+"""show end_time
+
+Revision ID: 3cee7c613391
+Revises: 6b7f5228e601
+Create Date: 2026-10-18 18:42:10.517305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3cee7c613391'
+down_revision = '6b7f5228e601'
+branch_labels = None
+depends_on = None
+
+# (constraint, column) of the Postgres double booking constraints
+EXCLUSIONS = [
+    ('ex_Show_venue_id_time', 'venue_id'),
+    ('ex_Show_artist_id_time', 'artist_id'),
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != 'postgresql':
+        # Like updated_at, added NOT NULL with a constant default so SQLite
+        # does not rebuild the table, then filled in. Shows end two hours
+        # after they start.
+        with op.batch_alter_table('Show', schema=None, recreate='never') as batch_op:
+            batch_op.add_column(sa.Column('end_time', sa.DateTime(), server_default=sa.text("'1970-01-01 00:00:00'"), nullable=False))
+        op.execute('''UPDATE "Show" SET end_time = datetime(start_time, '+2 hours')''')
+        return
+
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # Existing shows end two hours after they start, or earlier when the
+    # venue or the artist has another show by then, so that the constraints
+    # below hold. Shows sharing a start time end up empty, which overlaps
+    # nothing.
+    op.execute('''
+        UPDATE "Show" s SET end_time = LEAST(s.start_time + interval '2 hours', n.next_at_venue, n.next_by_artist)
+        FROM (
+            SELECT id,
+                   lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS next_at_venue,
+                   lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS next_by_artist
+            FROM "Show"
+        ) n
+        WHERE n.id = s.id
+    ''')
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_Show_end_time', 'Show', 'end_time >= start_time')
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in EXCLUSIONS:
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "{}" '
+            'EXCLUDE USING gist ({} WITH =, tsrange(start_time, end_time) WITH &&)'.format(name, column)
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, _ in EXCLUSIONS:
+            op.drop_constraint(name, 'Show')
+        op.drop_constraint('ck_Show_end_time', 'Show')
+    op.drop_column('Show', 'end_time')
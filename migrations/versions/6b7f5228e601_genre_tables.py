@@ -0,0 +1,107 @@
+"""genre tables
+
+Revision ID: 6b7f5228e601
+Revises: 9fba57c64c6b
+Create Date: 2026-10-18 15:03:38.190254
+
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b7f5228e601'
+down_revision = '9fba57c64c6b'
+branch_labels = None
+depends_on = None
+
+# the choices forms.py offered before genres moved into their own table
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+    'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+]
+
+# (entity table, association table, association column)
+LINKS = [
+    ('Venue', 'VenueGenre', 'venue_id'),
+    ('Artist', 'ArtistGenre', 'artist_id'),
+]
+
+
+def parse_genres(value):
+    # genres were stored as json.dumps(list); be lenient with anything else
+    if not value:
+        return []
+    try:
+        names = json.loads(value)
+    except ValueError:
+        names = value.strip('{}').split(',')
+    if isinstance(names, str):
+        names = [names]
+    return [name.strip().strip('"') for name in names if name and name.strip()]
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, link, key in LINKS:
+        op.create_table(link,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+        sa.ForeignKeyConstraint([key], ['{}.id'.format(table)], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id_{}'.format(link, key), link, ['genre_id', key], unique=False)
+
+    # move the JSON strings into the new tables
+    connection = op.get_bind()
+    rows = {
+        table: connection.execute(sa.text('SELECT id, genres FROM "{}"'.format(table))).fetchall()
+        for table, _, _ in LINKS
+    }
+    names = list(GENRES)
+    for table_rows in rows.values():
+        for _, genres in table_rows:
+            names.extend(name for name in parse_genres(genres) if name not in names)
+    op.bulk_insert(genre, [{'id': id, 'name': name} for id, name in enumerate(names, 1)])
+    genre_ids = {name: id for id, name in enumerate(names, 1)}
+    for table, link, key in LINKS:
+        link_table = sa.table(link, sa.column(key), sa.column('genre_id'))
+        links = [
+            {key: id, 'genre_id': genre_ids[name]}
+            for id, genres in rows[table]
+            for name in set(parse_genres(genres))
+        ]
+        if links:
+            op.bulk_insert(link_table, links)
+        op.drop_column(table, 'genres')
+
+    if connection.dialect.name == 'postgresql':
+        op.execute("""SELECT setval(pg_get_serial_sequence('"Genre"', 'id'), {})""".format(len(names)))
+
+
+def downgrade():
+    connection = op.get_bind()
+    for table, link, key in LINKS:
+        op.add_column(table, sa.Column('genres', sa.String(length=120), nullable=True))
+        rows = connection.execute(sa.text(
+            'SELECT l.{key}, g.name FROM "{link}" l JOIN "Genre" g ON g.id = l.genre_id ORDER BY g.name'
+            .format(key=key, link=link)
+        )).fetchall()
+        genres = {}
+        for id, name in rows:
+            genres.setdefault(id, []).append(name)
+        entity = sa.table(table, sa.column('id'), sa.column('genres'))
+        connection.execute(entity.update().values(genres='[]'))
+        for id, names in genres.items():
+            connection.execute(entity.update().where(entity.c.id == id).values(genres=json.dumps(names)))
+        op.drop_index('ix_{}_genre_id_{}'.format(link, key), table_name=link)
+        op.drop_table(link)
+    op.drop_table('Genre')
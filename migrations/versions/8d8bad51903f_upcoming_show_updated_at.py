@@ -0,0 +1,83 @@
+"""upcoming show updated_at
+
+Revision ID: 8d8bad51903f
+Revises: 044cee2bea93
+Create Date: 2026-10-18 21:12:47.306518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d8bad51903f'
+down_revision = '044cee2bea93'
+branch_labels = None
+depends_on = None
+
+# (index, columns) on UpcomingShow
+INDEXES = [
+    ('ix_UpcomingShow_start_time_id', ['start_time', 'id']),
+    ('ix_UpcomingShow_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_UpcomingShow_artist_id_start_time', ['artist_id', 'start_time']),
+]
+
+# UpcomingShow gains the updated_at of each show, venue and artist, which key
+# the /shows tiles in the fragment cache. A materialized view cannot gain
+# columns, so it is dropped and created again on both sides.
+
+def create_upcoming_show(updated_at):
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('''
+            CREATE MATERIALIZED VIEW "UpcomingShow" AS
+            SELECT s.id, s.start_time, s.end_time,
+                   s.venue_id, v.name AS venue_name, v.image_link AS venue_image_link,
+                   s.artist_id, a.name AS artist_name, a.image_link AS artist_image_link{}
+            FROM "Show" s
+            JOIN "Venue" v ON v.id = s.venue_id
+            JOIN "Artist" a ON a.id = s.artist_id
+            WHERE s.start_time > LOCALTIMESTAMP - interval '1 day'
+        '''.format(
+            ',\n                   s.updated_at, v.updated_at AS venue_updated_at, a.updated_at AS artist_updated_at'
+            if updated_at else ''
+        ))
+        op.create_index('ix_UpcomingShow_id', 'UpcomingShow', ['id'], unique=True)
+    else:
+        # left empty until the next refresh, which the read path waits for
+        op.execute("DELETE FROM \"ReadModelRefresh\" WHERE name = 'upcoming_shows'")
+        op.create_table('UpcomingShow',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('venue_name', sa.String(), nullable=True),
+        sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('artist_name', sa.String(), nullable=True),
+        sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+        *([
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('venue_updated_at', sa.DateTime(), nullable=False),
+            sa.Column('artist_updated_at', sa.DateTime(), nullable=False),
+        ] if updated_at else []),
+        sa.PrimaryKeyConstraint('id')
+        )
+    for name, columns in INDEXES:
+        op.create_index(name, 'UpcomingShow', columns, unique=False)
+
+
+def drop_upcoming_show():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP MATERIALIZED VIEW "UpcomingShow"')
+    else:
+        op.drop_table('UpcomingShow')
+
+
+def upgrade():
+    drop_upcoming_show()
+    create_upcoming_show(updated_at=True)
+
+
+def downgrade():
+    drop_upcoming_show()
+    create_upcoming_show(updated_at=False)
@@ -0,0 +1,36 @@
+"""updated_at
+
+Revision ID: 9fba57c64c6b
+Revises: f1b3a421b611
+Create Date: 2026-10-18 13:21:05.662310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9fba57c64c6b'
+down_revision = 'f1b3a421b611'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite cannot add a column with a non-constant default in place, and
+    # rebuilding the tables would drop the name search triggers, so there
+    # the column starts from a constant and is then set to the current time.
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    server_default = sa.text("'1970-01-01 00:00:00'") if sqlite else sa.func.now()
+    for table in ('Artist', 'Show', 'Venue'):
+        with op.batch_alter_table(table, schema=None, recreate='never') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=server_default, nullable=False))
+            batch_op.create_index(batch_op.f('ix_{}_updated_at'.format(table)), ['updated_at'], unique=False)
+        if sqlite:
+            op.execute('UPDATE "{}" SET updated_at = CURRENT_TIMESTAMP'.format(table))
+
+
+def downgrade():
+    for table in ('Venue', 'Show', 'Artist'):
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,72 @@
+"""name search indexes
+
+Revision ID: 9fc319baee50
+Revises: 73101b8dfb8a
+Create Date: 2026-10-18 09:12:44.301127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9fc319baee50'
+down_revision = '73101b8dfb8a'
+branch_labels = None
+depends_on = None
+
+# table -> external content FTS5 table used on SQLite
+FTS_TABLES = {
+    'Artist': 'artist_name_fts',
+    'Venue': 'venue_name_fts',
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # pg_trgm lets the GIN indexes serve name ILIKE '%term%' lookups.
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in FTS_TABLES:
+            op.create_index(
+                'ix_{}_name_trgm'.format(table.lower()), table, ['name'],
+                postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+            )
+    elif dialect == 'sqlite':
+        # The trigram tokenizer matches case-insensitive substrings of three
+        # or more characters; triggers keep the index in step with the table.
+        for table, fts in FTS_TABLES.items():
+            op.execute(
+                "CREATE VIRTUAL TABLE {fts} USING fts5("
+                "name, content='{table}', content_rowid='id', tokenize='trigram')"
+                .format(fts=fts, table=table)
+            )
+            op.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=fts))
+            op.execute(
+                'CREATE TRIGGER {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+                'INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END'
+                .format(fts=fts, table=table)
+            )
+            op.execute(
+                'CREATE TRIGGER {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+                "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END"
+                .format(fts=fts, table=table)
+            )
+            op.execute(
+                'CREATE TRIGGER {fts}_au AFTER UPDATE OF name ON "{table}" BEGIN '
+                "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+                'INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END'
+                .format(fts=fts, table=table)
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in FTS_TABLES:
+            op.drop_index('ix_{}_name_trgm'.format(table.lower()), table_name=table)
+    elif dialect == 'sqlite':
+        for fts in FTS_TABLES.values():
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS {}_{}'.format(fts, suffix))
+            op.execute('DROP TABLE IF EXISTS {}'.format(fts))
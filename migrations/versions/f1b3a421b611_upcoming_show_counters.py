@@ -0,0 +1,51 @@
+"""upcoming show counters
+
+Revision ID: f1b3a421b611
+Revises: 69bf3ee79dda
+Create Date: 2026-10-18 11:40:52.118044
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b3a421b611'
+down_revision = '69bf3ee79dda'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('counted_upcoming', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill the counters from the existing shows
+    show = sa.table('Show',
+        sa.column('artist_id'), sa.column('venue_id'),
+        sa.column('start_time', sa.DateTime()), sa.column('counted_upcoming'))
+    op.execute(show.update().values(counted_upcoming=show.c.start_time > datetime.now()))
+    for table_name, show_key in (('Artist', show.c.artist_id), ('Venue', show.c.venue_id)):
+        table = sa.table(table_name, sa.column('id'), sa.column('upcoming_show_count'))
+        counted = sa.select(sa.func.count()) \
+            .where(show.c.counted_upcoming, show_key == table.c.id) \
+            .scalar_subquery()
+        op.execute(table.update().values(upcoming_show_count=counted))
+
+
+def downgrade():
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.drop_column('upcoming_show_count')
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_column('counted_upcoming')
+
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        batch_op.drop_column('upcoming_show_count')
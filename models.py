@@ -1,9 +1,132 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import current_app, g, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# Views decorated with @read_only send their SELECTs to one of the replicas
+# in SQLALCHEMY_REPLICA_URIS. Everything else goes to the primary: writes,
+# SELECT ... FOR UPDATE, reads later in a request that has written, and every
+# read from a client for REPLICA_LAG_WINDOW seconds after it last wrote, so
+# people see their own changes while the replicas catch up. That window is
+# kept in a plain cookie rather than the signed session: it must hold
+# whichever process answers next, and reading it must not make every
+# read-only page vary on the session cookie. A forged value only sends the
+# client's own reads to the primary.
+
+PRIMARY_COOKIE = 'fyyur_primary_until'
+
+def replica_binds(count):
+    return ['replica_{}'.format(i) for i in range(count)]
+
+def configure_replicas(app):
+    # Call before db.init_app(app): registers each replica as a bind.
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    urls = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    binds.update(zip(replica_binds(len(urls)), urls))
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.after_request(_set_primary_cookie)
+
+def primary_until():
+    # When the current client's reads may go to the replicas again.
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        return 0
+
+def _set_primary_cookie(response):
+    until = g.pop('primary_until', None)
+    if until is not None:
+        response.set_cookie(PRIMARY_COOKIE, repr(until), max_age=int(until - time.time()) + 1,
+                            httponly=True, samesite='Lax')
+    return response
+
+def read_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._wrote = False
+        self._pinned = False
+        self._replica = None
+
+    @contextmanager
+    def primary(self):
+        # Reads inside the block go to the primary, e.g. to fill a cache that
+        # has just been invalidated by a write.
+        pinned, self._pinned = self._pinned, True
+        try:
+            yield
+        finally:
+            self._pinned = pinned
+
+    def _use_replica(self, clause):
+        if self._wrote or self._pinned or not has_request_context() or not g.get('read_only'):
+            return False
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return False
+        return primary_until() < time.time()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            if self._replica is None:
+                # one replica per request, so its reads are consistent
+                binds = replica_binds(len(current_app.config.get('SQLALCHEMY_REPLICA_URIS') or []))
+                self._replica = self._db.engines[random.choice(binds)] if binds else False
+            if self._replica:
+                return self._replica
+        if bind is None and (self._flushing or not isinstance(clause, Select)):
+            self._wrote = True
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(db_session):
+    if db_session._wrote and has_request_context() and current_app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        g.primary_until = time.time() + current_app.config.get('REPLICA_LAG_WINDOW', 5)
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+def utcnow():
+    # naive UTC timestamps for updated_at, which feeds HTTP Last-Modified
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+# (genre_id, venue_id) / (genre_id, artist_id) indexes serve the genre filters
+venue_genres = db.Table('VenueGenre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_VenueGenre_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table('ArtistGenre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_ArtistGenre_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
@@ -16,11 +139,15 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    show = db.relationship("Show", backref=db.backref("venue", lazy=True))
+    # maintained by the Show events below, see counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=utcnow, onupdate=utcnow, server_default=db.func.now())
+    genres = db.relationship("Genre", secondary="VenueGenre", order_by="Genre.name", lazy=True)
+    # deleting a venue deletes its shows, which cannot be without one
+    show = db.relationship("Show", backref=db.backref("venue", lazy=True), cascade="all, delete")
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
@@ -30,20 +157,159 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # maintained by the Show events below, see counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=utcnow, onupdate=utcnow, server_default=db.func.now())
+    genres = db.relationship("Genre", secondary="ArtistGenre", order_by="Genre.name", lazy=True)
     show = db.relationship("Show", backref=db.backref("artist", lazy=True))
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+# Shows last SHOW_DURATION unless given an end_time, and never longer than
+# MAX_SHOW_DURATION, which bounds how far back an overlap search has to look.
+SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=12)
+
+def _default_end_time(context):
+    return context.get_current_parameters()['start_time'] + SHOW_DURATION
+
 class Show(db.Model):
     __tablename__ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
\ No newline at end of file
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    end_time = db.Column(db.DateTime, nullable=False, default=_default_end_time)
+    # whether the show is included in its venue's and artist's upcoming_show_count
+    counted_upcoming = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=utcnow, onupdate=utcnow, server_default=db.func.now())
+
+    __table_args__ = (
+        # serve the per venue / per artist "upcoming shows" range filters
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # On Postgres a venue or artist cannot be booked twice at once. The
+        # GiST indexes behind the constraints also answer overlap searches.
+        db.CheckConstraint('end_time >= start_time', name='ck_Show_end_time').ddl_if(dialect='postgresql'),
+        ExcludeConstraint(
+            (venue_id, '='), (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_Show_venue_id_time', using='gist',
+        ).ddl_if(dialect='postgresql'),
+        ExcludeConstraint(
+            (artist_id, '='), (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_Show_artist_id_time', using='gist',
+        ).ddl_if(dialect='postgresql'),
+    )
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+# the exclusion constraints compare integers with = in a GiST index
+event.listen(Show.__table__, 'before_create', db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+def _adjust_upcoming_show_count(connection, show, delta):
+    for model, id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+        connection.execute(
+            db.update(model)
+            .where(model.id == id)
+            .values(upcoming_show_count=model.upcoming_show_count + delta)
+        )
+
+@event.listens_for(Show, 'before_insert')
+def _mark_upcoming_show(mapper, connection, show):
+    show.counted_upcoming = show.start_time > datetime.now()
+
+@event.listens_for(Show, 'after_insert')
+def _count_upcoming_show(mapper, connection, show):
+    if show.counted_upcoming:
+        _adjust_upcoming_show_count(connection, show, 1)
+
+@event.listens_for(Show, 'after_delete')
+def _uncount_upcoming_show(mapper, connection, show):
+    if show.counted_upcoming:
+        _adjust_upcoming_show_count(connection, show, -1)
+
+@event.listens_for(Venue.genres, 'append')
+@event.listens_for(Venue.genres, 'remove')
+@event.listens_for(Artist.genres, 'append')
+@event.listens_for(Artist.genres, 'remove')
+def _touch_on_genre_change(target, value, initiator):
+    # genres live in the association tables, so changing only them would
+    # otherwise leave updated_at (and the page validators) untouched
+    target.updated_at = utcnow()
+
+#----------------------------------------------------------------------------#
+# Read models.
+#----------------------------------------------------------------------------#
+
+# Upcoming shows with their venue and artist names and images, so /shows
+# can list them without joining. A materialized view on Postgres and a table
+# refreshed in place elsewhere; see upcoming.py. Alembic leaves tables
+# marked materialized_view to their migrations.
+upcoming_show_view = db.Table('UpcomingShow',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('start_time', db.DateTime, nullable=False),
+    db.Column('end_time', db.DateTime, nullable=False),
+    db.Column('venue_id', db.Integer, nullable=False),
+    db.Column('venue_name', db.String),
+    db.Column('venue_image_link', db.String(500)),
+    db.Column('artist_id', db.Integer, nullable=False),
+    db.Column('artist_name', db.String),
+    db.Column('artist_image_link', db.String(500)),
+    db.Column('updated_at', db.DateTime, nullable=False),
+    db.Column('venue_updated_at', db.DateTime, nullable=False),
+    db.Column('artist_updated_at', db.DateTime, nullable=False),
+    db.Index('ix_UpcomingShow_start_time_id', 'start_time', 'id'),
+    db.Index('ix_UpcomingShow_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_UpcomingShow_artist_id_start_time', 'artist_id', 'start_time'),
+    info={'materialized_view': True},
+)
+
+# when each read model was last refreshed, in naive UTC
+read_model_refreshes = db.Table('ReadModelRefresh',
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('refreshed_at', db.DateTime, nullable=False),
+)
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Migrate(include_object=...): autogenerate cannot see materialized
+    # views, so it would otherwise try to create them as tables.
+    table = object if type_ == 'table' else getattr(object, 'table', None)
+    return table is None or not table.info.get('materialized_view')
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+# Work deferred by request handlers, run by `flask jobs work`; see jobs.py.
+# Jobs are deleted once they succeed. A job that keeps failing stays behind
+# with status 'failed' and its last error.
+class Job(db.Model):
+    __tablename__ = 'Job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    args = db.Column(db.JSON, nullable=False)
+    # 'queued' or 'failed'
+    status = db.Column(db.String(16), nullable=False, default='queued', server_default='queued')
+    # naive UTC, like the lease and timestamps below
+    run_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False, default=5, server_default='5')
+    # the worker running the job, until locked_until
+    locked_by = db.Column(db.String(120))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        # workers claim the due queued jobs in run_at order
+        db.Index('ix_Job_status_run_at', 'status', 'run_at'),
+    )
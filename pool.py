@@ -0,0 +1,130 @@
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+#----------------------------------------------------------------------------#
+# Pool metrics.
+#----------------------------------------------------------------------------#
+
+class PoolStats:
+    # Counts checkouts from one TimedQueuePool and how long they waited,
+    # which includes opening a new connection when the pool had none idle.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self, pool):
+        stats = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_total": round(self.wait_total * 1000, 3),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+            "wait_ms_avg": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0,
+        }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+            })
+        return stats
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool recording every checkout in its own stats, so the primary
+    # and each replica are counted apart. A disposed engine's new pool starts
+    # from zero.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return record
+
+
+def pool_stats(engines):
+    # {bind: stats} for the engines with a TimedQueuePool, the primary
+    # (bind None) as 'primary', as in the /metrics labels.
+    return {
+        bind or 'primary': engine.pool.stats.snapshot(engine.pool)
+        for bind, engine in engines.items()
+        if isinstance(engine.pool, TimedQueuePool)
+    }
+
+#----------------------------------------------------------------------------#
+# Engine options.
+#----------------------------------------------------------------------------#
+
+def engine_options(config, url, asyncio=False):
+    # create_engine() options for url from the DB_POOL_*, DB_STATEMENT_TIMEOUT
+    # and DB_PGBOUNCER settings. In-memory SQLite and aiosqlite keep their
+    # default pools, which take none of the pool options.
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == 'sqlite' and (asyncio or url.database in (None, '', ':memory:')):
+        return {}
+    options = {
+        "pool_size": config.get('DB_POOL_SIZE', 5),
+        "max_overflow": config.get('DB_MAX_OVERFLOW', 10),
+        "pool_timeout": config.get('DB_POOL_TIMEOUT', 30),
+        "pool_recycle": config.get('DB_POOL_RECYCLE', -1),
+        "pool_pre_ping": config.get('DB_POOL_PRE_PING', False),
+    }
+    if not asyncio:
+        options["poolclass"] = TimedQueuePool
+    if backend != 'postgresql':
+        return options
+
+    timeout = config.get('DB_STATEMENT_TIMEOUT', 0)
+    if config.get('DB_PGBOUNCER'):
+        # PgBouncer in transaction mode hands each transaction to any server
+        # connection: prepared statements and session settings do not carry
+        # over, and startup options are refused. The timeout is set per
+        # transaction instead, see configure_engine().
+        if asyncio:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    elif timeout:
+        if asyncio:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout)}}
+        else:
+            options["connect_args"] = {"options": '-c statement_timeout={}'.format(timeout)}
+    return options
+
+def _set_local_statement_timeout(timeout):
+    def begin(connection):
+        if connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql('SET LOCAL statement_timeout = {:d}'.format(timeout))
+    return begin
+
+def configure_engine(app):
+    # Call before db.init_app(app). Options already in
+    # SQLALCHEMY_ENGINE_OPTIONS take precedence.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI']),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+    timeout = app.config.get('DB_STATEMENT_TIMEOUT', 0)
+    if app.config.get('DB_PGBOUNCER') and timeout:
+        event.listen(Engine, 'begin', _set_local_statement_timeout(timeout))
@@ -0,0 +1,133 @@
+import atexit
+import json
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from flask import render_template, request
+from sqltimer import query_timer
+#----------------------------------------------------------------------------#
+# Statement shapes.
+#----------------------------------------------------------------------------#
+
+# Statements are compared by shape: whitespace is collapsed and expanded IN
+# lists become a single placeholder, so the same query with other parameters
+# has the same shape. A SELECT shape repeated within one request is the
+# signature of an N+1 loop.
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)'
+_PLACEHOLDER_LIST = re.compile(r'\(\s*{0}(?:\s*,\s*{0})+\s*\)'.format(_PLACEHOLDER))
+
+def statement_shape(statement):
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+#----------------------------------------------------------------------------#
+# Profiler.
+#----------------------------------------------------------------------------#
+
+class QueryProfiler:
+    # Records every statement run while handling a request: the count, the
+    # time spent in the database and repeated shapes. Results are sent as
+    # X-Query-* and Server-Timing headers, as a panel at the bottom of HTML
+    # pages when PROFILER_PANEL is set, and summed up per route when the
+    # process exits. Statements come from sqltimer, which cannot see those a
+    # streamed response runs while it is sent, so streamed responses get no
+    # headers and are left out of the summary.
+    def __init__(self, app=None):
+        self.threshold = 5
+        self.routes = defaultdict(lambda: {"requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "n_plus_one": Counter()})
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('PROFILER_ENABLED'):
+            return
+        self.app = app
+        self.threshold = app.config.get('PROFILER_N_PLUS_ONE_THRESHOLD', 5)
+        self.panel = app.config.get('PROFILER_PANEL', False)
+        self.report_path = app.config.get('PROFILER_REPORT')
+        query_timer.init_app(app)
+        app.after_request(self._after_request)
+        atexit.register(self.dump)
+
+    def request_stats(self):
+        timed = query_timer.current()
+        queries = [(statement_shape(statement), elapsed) for statement, elapsed in (timed.statements if timed else [])]
+        shapes = Counter(shape for shape, _ in queries)
+        times = defaultdict(float)
+        for shape, elapsed in queries:
+            times[shape] += elapsed
+        return {
+            "queries": len(queries),
+            "db_ms": sum(elapsed for _, elapsed in queries) * 1000,
+            "duplicates": len(queries) - len(shapes),
+            "n_plus_one": [
+                (shape, count) for shape, count in shapes.most_common()
+                if count >= self.threshold and shape.upper().startswith('SELECT')
+            ],
+            "statements": [
+                (shape, count, times[shape] * 1000) for shape, count in shapes.most_common()
+            ],
+        }
+
+    def _after_request(self, response):
+        if response.is_streamed:
+            return response
+        stats = self.request_stats()
+        endpoint = request.endpoint or request.path
+        for shape, count in stats["n_plus_one"]:
+            self.app.logger.warning('possible N+1 in %s: %d x %s', endpoint, count, shape)
+
+        response.headers['X-Query-Count'] = str(stats["queries"])
+        response.headers['X-Query-Time'] = '{:.2f}'.format(stats["db_ms"])
+        response.headers['X-Query-Duplicates'] = str(stats["duplicates"])
+        response.headers['X-Query-N-Plus-One'] = str(len(stats["n_plus_one"]))
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(stats["db_ms"], stats["queries"]))
+        if self.panel and response.mimetype == 'text/html' \
+                and not response.direct_passthrough and response.status_code == 200:
+            html = response.get_data(as_text=True)
+            if '</body>' in html:
+                panel = render_template('profiler/panel.html', stats=stats, threshold=self.threshold)
+                response.set_data(html.replace('</body>', panel + '</body>', 1))
+
+        with self._lock:
+            route = self.routes[endpoint]
+            route["requests"] += 1
+            route["queries"] += stats["queries"]
+            route["max_queries"] = max(route["max_queries"], stats["queries"])
+            route["db_ms"] += stats["db_ms"]
+            route["n_plus_one"].update(shape for shape, _ in stats["n_plus_one"])
+        return response
+
+    def summary(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": route["requests"],
+                    "avg_queries": route["queries"] / route["requests"],
+                    "max_queries": route["max_queries"],
+                    "avg_db_ms": route["db_ms"] / route["requests"],
+                    "n_plus_one": dict(route["n_plus_one"]),
+                }
+                for endpoint, route in self.routes.items()
+            }
+
+    def dump(self):
+        # Prints the per-route summary and writes it to PROFILER_REPORT.
+        summary = self.summary()
+        if not summary:
+            return
+        lines = ['{:<32} {:>8} {:>12} {:>12} {:>12}'.format('route', 'requests', 'avg queries', 'max queries', 'avg db ms')]
+        for endpoint, route in sorted(summary.items(), key=lambda item: -item[1]["avg_queries"]):
+            lines.append('{:<32} {:>8} {:>12.1f} {:>12} {:>12.2f}{}'.format(
+                endpoint, route["requests"], route["avg_queries"], route["max_queries"], route["avg_db_ms"],
+                '   N+1' if route["n_plus_one"] else ''))
+        print('\n'.join(lines), file=sys.stderr)
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,320 @@
+from datetime import datetime, timezone
+from itertools import groupby
+from sqlalchemy import and_, case, func, or_, select, true
+from models import db, Genre, Venue, Artist, Show, venue_genres, artist_genres, upcoming_show_view, read_model_refreshes
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def genres_named(names):
+    # Genre rows for the genre names picked in a form.
+    if not names:
+        return []
+    return Genre.query.filter(Genre.name.in_(names)).order_by(Genre.name).all()
+
+GENRE_LINKS = {
+    Venue: venue_genres.c.venue_id,
+    Artist: artist_genres.c.artist_id,
+}
+
+def with_genres(model, names, id_column=None):
+    # Filter keeping rows of model tagged with any of the genre names, as a
+    # semi-join served by the (genre_id, <model>_id) association index.
+    link = GENRE_LINKS[model]
+    tagged = select(link) \
+        .join(Genre, Genre.id == link.table.c.genre_id) \
+        .where(Genre.name.in_(names))
+    return (model.id if id_column is None else id_column).in_(tagged)
+
+def genre_names(model):
+    # Correlated subquery of a venue's or artist's genre names joined with ';'.
+    link = GENRE_LINKS[model]
+    return select(func.aggregate_strings(Genre.name, ';')) \
+        .join(link.table, link.table.c.genre_id == Genre.id) \
+        .where(link == model.id) \
+        .scalar_subquery()
+
+# The statements are built separately from running them so the async read
+# path in aio.py runs exactly the same SQL.
+
+def venue_area_select(genres=None):
+    query = select(Venue.city, Venue.state, Venue.id, Venue.name, Venue.upcoming_show_count, Venue.updated_at)
+    if genres:
+        query = query.where(with_genres(Venue, genres))
+    return query.order_by(Venue.state, Venue.city, Venue.id)
+
+def group_areas(rows):
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.upcoming_show_count,
+                "updated_at": venue.updated_at,
+            } for venue in venues]
+        })
+    return areas
+
+def venue_areas(genres=None):
+    # Builds the city/state -> venues -> num_upcoming_shows tree used by
+    # pages/venues.html from a single statement, reading the maintained
+    # upcoming_show_count so the Show table is not touched at all.
+    return group_areas(db.session.execute(venue_area_select(genres)).all())
+
+def artist_list_select(genres=None):
+    query = select(Artist.id, Artist.name, Artist.updated_at)
+    if genres:
+        query = query.where(with_genres(Artist, genres))
+    return query.order_by(Artist.id)
+
+def artist_list(genres=None):
+    # The id, name and updated_at of every artist, as pages/artists.html lists them.
+    return db.session.execute(artist_list_select(genres)).all()
+
+def split_shows(rows, keys, current_time):
+    # Splits (start_time, *columns) rows into past and upcoming show dicts in
+    # a single pass; `keys` names the columns following start_time.
+    past_shows = []
+    upcoming_shows = []
+    for start_time, *values in rows:
+        show = dict(zip(keys, values))
+        show["start_time"] = start_time
+        if start_time > current_time:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return past_shows, upcoming_shows
+
+def with_split_shows(data, keys, current_time):
+    # A venue_detail or artist_detail dict as its page renders it.
+    past_shows, upcoming_shows = split_shows(data["shows"], keys, current_time)
+    return dict(data,
+        past_shows=past_shows,
+        upcoming_shows=upcoming_shows,
+        past_shows_count=len(past_shows),
+        upcoming_shows_count=len(upcoming_shows),
+    )
+
+VENUE_SHOW_KEYS = ("artist_id", "artist_name", "artist_image_link")
+ARTIST_SHOW_KEYS = ("venue_id", "venue_name", "venue_image_link")
+
+def venue_show_select(venue_id):
+    # Every show at a venue with the artist columns pages/show_venue.html uses.
+    return select(Show.start_time, Artist.id, Artist.name, Artist.image_link) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .where(Show.venue_id == venue_id) \
+        .order_by(Show.start_time)
+
+def artist_show_select(artist_id):
+    # Every show by an artist with the venue columns pages/show_artist.html uses.
+    return select(Show.start_time, Venue.id, Venue.name, Venue.image_link) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .where(Show.artist_id == artist_id) \
+        .order_by(Show.start_time)
+
+def venue_show_rows(venue_id):
+    return [tuple(row) for row in db.session.execute(venue_show_select(venue_id))]
+
+def artist_show_rows(artist_id):
+    return [tuple(row) for row in db.session.execute(artist_show_select(artist_id))]
+
+def venue_shows(venue_id, current_time=None):
+    return split_shows(venue_show_rows(venue_id), VENUE_SHOW_KEYS, current_time or datetime.now())
+
+def artist_shows(artist_id, current_time=None):
+    return split_shows(artist_show_rows(artist_id), ARTIST_SHOW_KEYS, current_time or datetime.now())
+
+def genre_name_select(model, id):
+    link = GENRE_LINKS[model]
+    return select(Genre.name) \
+        .join(link.table, link.table.c.genre_id == Genre.id) \
+        .where(link == id) \
+        .order_by(Genre.name)
+
+def venue_select(venue_id):
+    return select(
+        Venue.id, Venue.name, Venue.address, Venue.city, Venue.state, Venue.phone,
+        Venue.website_link.label('website'), Venue.facebook_link, Venue.seeking_talent,
+        Venue.seeking_description, Venue.image_link,
+    ).where(Venue.id == venue_id)
+
+def artist_select(artist_id):
+    return select(
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+        Artist.website_link.label('website'), Artist.facebook_link, Artist.seeking_venue,
+        Artist.seeking_description, Artist.image_link,
+    ).where(Artist.id == artist_id)
+
+def detail_dict(row, genres, shows):
+    return dict(row._mapping, genres=list(genres), shows=[tuple(show) for show in shows])
+
+def venue_detail(venue_id):
+    # Everything pages/show_venue.html needs apart from the past/upcoming
+    # split, which depends on the time of the request. None if no such venue.
+    row = db.session.execute(venue_select(venue_id)).first()
+    if row is None:
+        return None
+    genres = db.session.execute(genre_name_select(Venue, venue_id)).scalars()
+    return detail_dict(row, genres, db.session.execute(venue_show_select(venue_id)))
+
+def artist_detail(artist_id):
+    # Everything pages/show_artist.html needs apart from the past/upcoming
+    # split, which depends on the time of the request. None if no such artist.
+    row = db.session.execute(artist_select(artist_id)).first()
+    if row is None:
+        return None
+    genres = db.session.execute(genre_name_select(Artist, artist_id)).scalars()
+    return detail_dict(row, genres, db.session.execute(artist_show_select(artist_id)))
+
+def encode_show_cursor(start_time, id):
+    return '{}_{}'.format(start_time.isoformat(), id)
+
+def decode_show_cursor(cursor):
+    start_time, id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(id)
+
+def filter_shows(query, upcoming=False, start=None, end=None, venue_id=None, artist_id=None,
+                 after=None, current_time=None, source=Show):
+    # Applies the /shows filters to a query over Show, or over the columns of
+    # upcoming_show_view as `source`, ordered on (start_time, id) so `after`
+    # can resume from a cursor.
+    if upcoming:
+        query = query.filter(source.start_time > (current_time or datetime.now()))
+    if start is not None:
+        query = query.filter(source.start_time >= start)
+    if end is not None:
+        query = query.filter(source.start_time < end)
+    if venue_id is not None:
+        query = query.filter(source.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(source.artist_id == artist_id)
+    if after:
+        start_time, id = decode_show_cursor(after)
+        # the redundant >= keeps the filter usable by the start_time index
+        query = query.filter(source.start_time >= start_time, or_(
+            source.start_time > start_time,
+            and_(source.start_time == start_time, source.id > id),
+        ))
+    return query.order_by(source.start_time, source.id)
+
+def show_query(read_model=False, **filters):
+    # Shows joined to the venue and artist columns pages/shows.html uses. With
+    # read_model, upcoming shows are read from the precomputed UpcomingShow
+    # instead, see upcoming.py.
+    if read_model:
+        view = upcoming_show_view.c
+        query = select(
+            view.id, view.start_time, view.venue_id, view.venue_name, view.artist_id, view.artist_name, view.artist_image_link,
+            view.updated_at, view.venue_updated_at, view.artist_updated_at,
+        )
+        return filter_shows(query, source=view, **filters)
+    query = select(
+        Show.id, Show.start_time, Venue.id, Venue.name, Artist.id, Artist.name, Artist.image_link,
+        Show.updated_at, Venue.updated_at, Artist.updated_at,
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+    return filter_shows(query, **filters)
+
+def show_dict(row):
+    # updated_at is the latest change to the show, its venue or its artist,
+    # for the tile's fragment cache key
+    return {
+        "id": row[0],
+        "venue_id": row[2],
+        "venue_name": row[3],
+        "artist_id": row[4],
+        "artist_name": row[5],
+        "artist_image_link": row[6],
+        "start_time": row[1],
+        "updated_at": max(row[7:10]),
+    }
+
+def show_page_rows(rows, limit):
+    # One page of shows and the cursor of the next page, or None on the last,
+    # from the first limit + 1 rows of show_query.
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_show_cursor(rows[limit - 1][1], rows[limit - 1][0])
+    return [show_dict(row) for row in rows[:limit]], next_cursor
+
+def show_page(limit, read_model=False, **filters):
+    return show_page_rows(db.session.execute(show_query(read_model, **filters).limit(limit + 1)).all(), limit)
+
+def show_stream(batch_size=1000, read_model=False, **filters):
+    # Yields every matching show, fetching from a server side cursor in
+    # batches so memory stays flat however many rows match.
+    for row in db.session.execute(show_query(read_model, **filters).execution_options(yield_per=batch_size)):
+        yield show_dict(row)
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+# Each function returns (values, last_modified) for a page: values change
+# whenever the page would render differently, and last_modified is the UTC
+# time of the latest such change. Used for ETag / Last-Modified in conditional.py.
+
+def last_modified(updated_ats, last_started=None):
+    # updated_at columns are naive UTC; show start times are naive local time.
+    # A page also changes when a show moves from upcoming to past.
+    times = [t.replace(tzinfo=timezone.utc) for t in updated_ats if t is not None]
+    if last_started is not None:
+        times.append(last_started.astimezone(timezone.utc))
+    return max(times, default=None)
+
+def show_validator_select(model, id, current_time):
+    # The record's updated_at next to the latest change to its shows and to
+    # the venues or artists they are with, how many shows it has and when
+    # the last of them started. No row if there is no such record.
+    show_key, other, other_key = (Show.venue_id, Artist, Show.artist_id) if model is Venue \
+        else (Show.artist_id, Venue, Show.venue_id)
+    shows = select(
+        func.max(Show.updated_at),
+        func.max(other.updated_at),
+        func.count(Show.id),
+        func.max(case((Show.start_time <= current_time, Show.start_time))),
+    ).join(other, other_key == other.id) \
+        .where(show_key == id) \
+        .subquery()
+    # the aggregates are a single row, joined onto the record's
+    return select(model.updated_at, *shows.c).join(shows, true()).where(model.id == id)
+
+def show_validator_values(row):
+    if row is None:
+        return None
+    return tuple(row), last_modified(row[:3], row[4])
+
+def venue_validators(venue_id, current_time=None):
+    return show_validator_values(db.session.execute(show_validator_select(Venue, venue_id, current_time or datetime.now())).first())
+
+def artist_validators(artist_id, current_time=None):
+    return show_validator_values(db.session.execute(show_validator_select(Artist, artist_id, current_time or datetime.now())).first())
+
+def list_validator_select(model):
+    return select(func.max(model.updated_at), func.count(model.id))
+
+def list_validator_values(row):
+    return tuple(row), last_modified([row[0]])
+
+def list_validators(model):
+    return list_validator_values(db.session.execute(list_validator_select(model)).one())
+
+def show_list_validator_select(current_time):
+    return select(
+        select(func.max(Show.updated_at)).scalar_subquery(),
+        select(func.max(Venue.updated_at)).scalar_subquery(),
+        select(func.max(Artist.updated_at)).scalar_subquery(),
+        select(func.count(Show.id)).scalar_subquery(),
+        select(func.max(Show.start_time)).where(Show.start_time <= current_time).scalar_subquery(),
+        # ?upcoming=1 may be read from the UpcomingShow read model
+        select(func.max(read_model_refreshes.c.refreshed_at)).scalar_subquery(),
+    )
+
+def show_list_validator_values(row):
+    return tuple(row), last_modified(row[:3] + (row[5],), row[4])
+
+def show_list_validators(current_time=None):
+    return show_list_validator_values(db.session.execute(show_list_validator_select(current_time or datetime.now())).one())
@@ -0,0 +1,205 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import and_, func, or_, select
+from models import db, Show, MAX_SHOW_DURATION
+#----------------------------------------------------------------------------#
+# Interval tree.
+#----------------------------------------------------------------------------#
+
+# A treap ordered by start, each node also holding the latest end in its
+# subtree. Finding the intervals overlapping [start, end) skips any subtree
+# ending before start or beginning after end, so it takes O(log n + k) for k
+# results. Intervals are half open: one show may start as another ends.
+
+class _Node:
+    __slots__ = ('start', 'end', 'value', 'priority', 'max_end', 'left', 'right')
+
+    def __init__(self, start, end, value, priority):
+        self.start = start
+        self.end = end
+        self.value = value
+        self.priority = priority
+        self.max_end = end
+        self.left = None
+        self.right = None
+
+    def update(self):
+        self.max_end = self.end
+        for child in (self.left, self.right):
+            if child is not None and child.max_end > self.max_end:
+                self.max_end = child.max_end
+
+
+class IntervalTree:
+    def __init__(self, intervals=()):
+        self._root = None
+        self._random = random.Random(0)
+        self._size = 0
+        for start, end, value in intervals:
+            self.add(start, end, value)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, start, end, value=None):
+        self._root = self._insert(self._root, _Node(start, end, value, self._random.random()))
+        self._size += 1
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if new.start < node.start:
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                node = self._rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                node = self._rotate_left(node)
+        node.update()
+        return node
+
+    def _rotate_right(self, node):
+        left = node.left
+        node.left, left.right = left.right, node
+        node.update()
+        left.update()
+        return left
+
+    def _rotate_left(self, node):
+        right = node.right
+        node.right, right.left = right.left, node
+        node.update()
+        right.update()
+        return right
+
+    def overlapping(self, start, end):
+        # (start, end, value) of every interval overlapping [start, end), in
+        # start order. Empty intervals overlap nothing.
+        found = []
+        if start < end:
+            self._collect(self._root, start, end, found)
+        return found
+
+    def _collect(self, node, start, end, found):
+        if node is None or node.max_end <= start:
+            return
+        self._collect(node.left, start, end, found)
+        if node.start < end:
+            if start < node.end and node.start < node.end:
+                found.append((node.start, node.end, node.value))
+            self._collect(node.right, start, end, found)
+
+#----------------------------------------------------------------------------#
+# Conflicts.
+#----------------------------------------------------------------------------#
+
+# On Postgres the exclusion constraints on Show make double bookings fail
+# and their GiST indexes answer the tsrange overlap test. Elsewhere the
+# (venue_id, start_time) and (artist_id, start_time) indexes are scanned
+# from MAX_SHOW_DURATION before the start, as no show that began earlier can
+# still be running.
+
+def overlaps(start_time, end_time):
+    if db.engine.dialect.name == 'postgresql':
+        return func.tsrange(Show.start_time, Show.end_time).op('&&')(func.tsrange(start_time, end_time))
+    return and_(
+        Show.start_time > start_time - MAX_SHOW_DURATION,
+        Show.start_time < end_time,
+        Show.end_time > start_time,
+        Show.end_time > Show.start_time,
+    )
+
+def conflicting(venue_id, artist_id, start_time, end_time):
+    # Shows booking the venue or the artist at some point in
+    # [start_time, end_time). Each branch of the OR has its own index.
+    overlap = overlaps(start_time, end_time)
+    return or_(
+        and_(Show.venue_id == venue_id, overlap),
+        and_(Show.artist_id == artist_id, overlap),
+    )
+
+def lock_schedule():
+    # Call before conflicts() when about to book, so that no other show is
+    # booked between the check and the insert. Postgres needs nothing as its
+    # exclusion constraints reject the later of two clashing inserts; SQLite
+    # has no such constraint, so its write lock is taken up front and held
+    # until the session commits or rolls back.
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+def conflicts(venue_id, artist_id, start_time, end_time):
+    if end_time <= start_time:
+        return []
+    query = select(Show).where(conflicting(venue_id, artist_id, start_time, end_time))
+    return db.session.scalars(query.order_by(Show.start_time, Show.id)).all()
+
+
+class BatchChecker:
+    # Checks many new shows against the database and each other: one query
+    # loads the shows already booked for the batch's venues and artists over
+    # its time span into interval trees, which accepted shows then join.
+    def __init__(self, shows):
+        # shows: dicts with venue_id, artist_id, start_time and end_time
+        self.venues = defaultdict(IntervalTree)
+        self.artists = defaultdict(IntervalTree)
+        shows = [show for show in shows if show["end_time"] > show["start_time"]]
+        if not shows:
+            return
+        start = min(show["start_time"] for show in shows)
+        end = max(show["end_time"] for show in shows)
+        overlap = overlaps(start, end)
+        existing = db.session.execute(
+            select(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).where(or_(
+                and_(Show.venue_id.in_({show["venue_id"] for show in shows}), overlap),
+                and_(Show.artist_id.in_({show["artist_id"] for show in shows}), overlap),
+            ))
+        )
+        for id, venue_id, artist_id, start_time, end_time in existing:
+            self.venues[venue_id].add(start_time, end_time, id)
+            self.artists[artist_id].add(start_time, end_time, id)
+
+    def check(self, show):
+        # None if `show` fits, otherwise what it clashes with. Shows that fit
+        # are booked, so later ones in the batch are checked against them.
+        if show["end_time"] < show["start_time"]:
+            return 'end_time: before start_time'
+        if show["end_time"] - show["start_time"] > MAX_SHOW_DURATION:
+            return 'end_time: longer than {}'.format(MAX_SHOW_DURATION)
+        for name, trees in (('venue', self.venues), ('artist', self.artists)):
+            clash = trees[show[name + "_id"]].overlapping(show["start_time"], show["end_time"])
+            if clash:
+                start_time, end_time, id = clash[0]
+                return '{}: already booked {} - {}{}'.format(
+                    name, start_time, end_time, ' (show {})'.format(id) if id else '')
+        for name, trees in (('venue', self.venues), ('artist', self.artists)):
+            trees[show[name + "_id"]].add(show["start_time"], show["end_time"], show.get("id"))
+        return None
+
+#----------------------------------------------------------------------------#
+# Free slots.
+#----------------------------------------------------------------------------#
+
+def free_slots(venue_ids, start, end, min_length=timedelta(hours=1)):
+    # {venue_id: [(start, end), ...]} of the gaps of at least min_length
+    # between the shows booked at each venue within [start, end), fetched
+    # with one query for all venues.
+    booked = db.session.execute(
+        select(Show.venue_id, Show.start_time, Show.end_time)
+        .where(Show.venue_id.in_(venue_ids), overlaps(start, end))
+        .order_by(Show.venue_id, Show.start_time)
+    )
+    shows = defaultdict(list)
+    for venue_id, start_time, end_time in booked:
+        shows[venue_id].append((start_time, end_time))
+    slots = {}
+    for venue_id in venue_ids:
+        gaps, free_from = [], start
+        for start_time, end_time in shows[venue_id] + [(end, end)]:
+            if start_time - free_from >= min_length:
+                gaps.append((free_from, min(start_time, end)))
+            free_from = max(free_from, end_time)
+        slots[venue_id] = gaps
+    return slots
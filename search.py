@@ -0,0 +1,127 @@
+from flask import current_app
+from sqlalchemy import Float, and_, case, cast, column, func, literal, or_, select, table
+from models import db, Venue, Artist
+from queries import with_genres
+#----------------------------------------------------------------------------#
+# Search backends.
+#----------------------------------------------------------------------------#
+
+# Each backend turns a search term into a subquery of (id, score) rows for
+# the names that contain the term, case-insensitively. Higher scores rank first.
+
+class LikeBackend:
+    # Portable fallback: a plain ILIKE scan. Exact and prefix matches rank
+    # above other substring matches.
+    def matches(self, model, search_term):
+        score = case(
+            (func.lower(model.name) == search_term.lower(), 2.0),
+            (model.name.ilike(f'{search_term}%'), 1.0),
+            else_=0.0,
+        )
+        return select(model.id.label('id'), cast(score, Float).label('score')) \
+            .where(model.name.ilike(f'%{search_term}%')) \
+            .subquery()
+
+
+class TrigramBackend(LikeBackend):
+    # Postgres: the ILIKE filter is served by the pg_trgm GIN index on name
+    # and results are ranked by trigram similarity to the term.
+    def matches(self, model, search_term):
+        score = cast(func.similarity(model.name, search_term), Float)
+        return select(model.id.label('id'), score.label('score')) \
+            .where(model.name.ilike(f'%{search_term}%')) \
+            .subquery()
+
+
+class FtsBackend(LikeBackend):
+    # SQLite: queries the FTS5 trigram tables and ranks by bm25. The trigram
+    # tokenizer cannot match terms shorter than three characters, so those
+    # fall back to the ILIKE scan.
+    TABLES = {
+        Venue: 'venue_name_fts',
+        Artist: 'artist_name_fts',
+    }
+
+    def matches(self, model, search_term):
+        if len(search_term) < 3:
+            return super().matches(model, search_term)
+        name = self.TABLES[model]
+        fts = table(name, column('rowid'), column('rank'), column(name))
+        phrase = '"{}"'.format(search_term.replace('"', '""'))
+        return select(fts.c.rowid.label('id'), (-fts.c.rank).label('score')) \
+            .where(fts.c[name].op('MATCH')(phrase)) \
+            .subquery()
+
+
+BACKENDS = {
+    'like': LikeBackend,
+    'trigram': TrigramBackend,
+    'fts5': FtsBackend,
+}
+
+DIALECT_BACKENDS = {
+    'postgresql': 'trigram',
+    'sqlite': 'fts5',
+}
+
+def get_backend():
+    name = current_app.config.get('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = DIALECT_BACKENDS.get(db.engine.dialect.name, 'like')
+    return BACKENDS[name]()
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(score, id):
+    return '{!r}:{}'.format(score, id)
+
+def decode_cursor(cursor):
+    score, id = cursor.rsplit(':', 1)
+    return float(score), int(id)
+
+def search(model, search_term, limit=None, after=None, genres=None):
+    # Case-insensitive partial match on name, ranked by relevance and
+    # optionally limited to any of the given genres. Always two statements:
+    # one for the total count and one for the requested page with the
+    # maintained upcoming show counts. Pages are keyset paginated on
+    # (score, id); `after` is the `next` cursor returned with the previous page.
+    # A malformed cursor raises ValueError before anything is queried.
+    if limit is None:
+        limit = current_app.config.get('SEARCH_RESULT_LIMIT', 20)
+    cursor = decode_cursor(after) if after else None
+    matches = get_backend().matches(model, search_term)
+
+    count_query = db.session.query(func.count()).select_from(matches)
+    if genres:
+        count_query = count_query.filter(with_genres(model, genres, matches.c.id))
+    count = count_query.scalar()
+
+    query = db.session.query(model.id, model.name, matches.c.score, model.upcoming_show_count) \
+        .join(matches, matches.c.id == model.id)
+    if genres:
+        query = query.filter(with_genres(model, genres))
+    if cursor:
+        score, id = cursor
+        query = query.filter(or_(
+            matches.c.score < literal(score, Float),
+            and_(matches.c.score == literal(score, Float), model.id > id),
+        ))
+    rows = query.order_by(matches.c.score.desc(), model.id) \
+        .limit(limit + 1) \
+        .all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.score, last.id)
+    return {
+        "count": count,
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.upcoming_show_count,
+        } for row in rows[:limit]],
+        "next": next_cursor,
+    }
@@ -0,0 +1,62 @@
+import time
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+#----------------------------------------------------------------------------#
+# Request statement timing.
+#----------------------------------------------------------------------------#
+
+# One pair of Engine listeners times every statement run while handling a
+# request and records it in g.queries, which the profiler, the metrics and
+# the access log all read: one timer per statement, one count per request.
+# Statements run while a streamed response is being sent, e.g. /shows?stream=1,
+# come after the after_request hooks, so those do not count them.
+
+
+class RequestQueries:
+    def __init__(self):
+        # (statement, seconds) in the order they ran
+        self.statements = []
+        self.seconds = 0.0
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+class QueryTimer:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Called by every extension that reads the timings; sets up once.
+        if 'query_timer' in app.extensions:
+            return
+        app.extensions['query_timer'] = self
+        app.before_request(self._start)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    def current(self):
+        # This request's RequestQueries, or None outside a timed request.
+        return g.get('queries') if has_request_context() else None
+
+    def _start(self):
+        g.queries = RequestQueries()
+
+    def _before_execute(self, connection, cursor, statement, parameters, context, executemany):
+        if self.current() is not None:
+            connection.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_execute(self, connection, cursor, statement, parameters, context, executemany):
+        if connection.info.get('query_start'):
+            elapsed = time.perf_counter() - connection.info['query_start'].pop()
+            queries = self.current()
+            if queries is not None:
+                queries.statements.append((statement, elapsed))
+                queries.seconds += elapsed
+
+
+query_timer = QueryTimer()
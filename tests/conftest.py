@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads its configuration when imported, so point it at a throwaway
+# SQLite file first.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='fyyur-tests-'), 'primary.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE
+os.environ.setdefault('CACHE_BACKEND', 'none')
+
+from app import app as fyyur
+from models import db
+
+
+@pytest.fixture
+def app():
+    fyyur.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with fyyur.app_context():
+        db.drop_all()
+        db.create_all()
+        yield fyyur
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,76 @@
+import gzip
+import json
+import pytest
+from benchmarks.datagen import seed
+
+
+@pytest.fixture
+def api_app(app):
+    seed(12, 12, 40)
+    yield app
+
+
+def pages(client, path, **args):
+    # every page of a list endpoint, following `next`
+    args["after"] = None
+    while True:
+        body = client.get(path, query_string={k: v for k, v in args.items() if v is not None}).json
+        yield body
+        args["after"] = body["next"]
+        if args["after"] is None:
+            return
+
+
+def test_fields_select_what_is_returned(api_app, client):
+    body = client.get('/api/v1/venues', query_string={"fields": "name,city"}).json
+    assert body["data"] and all(set(venue) == {"name", "city"} for venue in body["data"])
+    shows = client.get('/api/v1/shows', query_string={"fields": "id,venue_name"}).json["data"]
+    assert shows and all(set(show) == {"id", "venue_name"} for show in shows)
+
+
+@pytest.mark.parametrize('path', ['/api/v1/venues', '/api/v1/artists'])
+def test_pages_follow_next(api_app, client, path):
+    ids = [record["id"] for body in pages(client, path, limit=5, fields='id') for record in body["data"]]
+    assert ids == list(range(1, 13))
+
+
+def test_show_pages_follow_next(api_app, client):
+    ids = [record["id"] for body in pages(client, '/api/v1/shows', limit=7, fields='id') for record in body["data"]]
+    assert sorted(ids) == list(range(1, 41)) and len(ids) == 40
+
+
+def test_large_bodies_are_gzipped(api_app, client):
+    api_app.config['API_COMPRESS_MIN_SIZE'] = 1024
+    response = client.get('/api/v1/venues', headers={"Accept-Encoding": "gzip"})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.data))["data"]) == 12
+
+    small = client.get('/api/v1/venues/1', query_string={"fields": "id"}, headers={"Accept-Encoding": "gzip"})
+    assert 'Content-Encoding' not in small.headers
+    assert small.json == {"data": {"id": 1}}
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/api/v1/venues?after=bad', 400),
+    ('/api/v1/artists?after=1.5', 400),
+    ('/api/v1/shows?after=bad', 400),
+    ('/api/v1/venues?fields=name,nope', 400),
+    ('/api/v1/venues/999', 404),
+    ('/api/v1/nowhere', 404),
+    ('/api/v1/venues/1/nowhere', 404),
+    ('/api/v1/', 404),
+])
+def test_errors_are_json(api_app, client, path, status):
+    response = client.get(path)
+    assert response.status_code == status
+    assert response.mimetype == 'application/json'
+    assert response.json["error"]
+
+
+def test_other_methods_are_not_allowed(api_app, client):
+    response = client.post('/api/v1/venues')
+    assert response.status_code == 405
+    assert response.json["error"]
+    assert response.headers['Allow'] == 'GET, HEAD'
+    assert client.post('/api/v1/nowhere').status_code == 404
@@ -0,0 +1,77 @@
+import asyncio
+import httpx
+import pytest
+from benchmarks.datagen import seed
+from cache import page_cache
+from test_cache import FakeRedis
+
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+def asgi_get(path, headers=None):
+    from asgi import application
+    async def get():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://fyyur') as client:
+            response = await client.get(path, headers=headers)
+        await application.dispose()
+        return response
+    return asyncio.run(get())
+
+
+@pytest.mark.parametrize('path', PAGES)
+def test_validators_match_the_flask_views(app, client, path):
+    seed(5, 5, 20)
+    sync = client.get(path)
+    response = asgi_get(path)
+    assert response.status_code == sync.status_code == 200
+    assert response.headers['etag'] == sync.headers['etag']
+    assert response.headers['last-modified'] == sync.headers['last-modified']
+    assert response.headers['cache-control'] == sync.headers['cache-control']
+
+
+@pytest.mark.parametrize('path', PAGES)
+def test_unchanged_page_is_not_modified(app, path):
+    seed(5, 5, 20)
+    etag = asgi_get(path).headers['etag']
+    response = asgi_get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+
+
+@pytest.mark.parametrize('backend', ['lru', 'redis'])
+def test_detail_pages_use_the_page_cache(app, backend):
+    seed(5, 5, 20)
+    previous = app.config['CACHE_BACKEND']
+    app.config.update(CACHE_BACKEND=backend, CACHE_REDIS_CLIENT=FakeRedis())
+    page_cache.init_app(app)
+    page_cache.hits = page_cache.misses = 0
+    try:
+        asgi_get('/venues/1')
+        asgi_get('/venues/1')
+        assert page_cache.stats() == {"hits": 1, "misses": 1}
+    finally:
+        app.config.update(CACHE_BACKEND=previous, CACHE_REDIS_CLIENT=None)
+        page_cache.init_app(app)
+
+
+@pytest.mark.parametrize('stream', ['0', 'no', 'false'])
+def test_stream_off_is_served_a_page_at_a_time(app, stream):
+    seed(5, 5, 20)
+    app.config['SHOWS_PAGE_SIZE'] = 5
+    try:
+        page = asgi_get('/shows?stream=' + stream).text
+        assert 'after=' in page
+    finally:
+        app.config['SHOWS_PAGE_SIZE'] = 60
+
+
+def test_stream_is_left_to_the_flask_view(app):
+    seed(5, 5, 20)
+    app.config['SHOWS_PAGE_SIZE'] = 5
+    try:
+        page = asgi_get('/shows?stream=1').text
+        assert 'after=' not in page
+        assert page.count('/venues/') >= 20
+    finally:
+        app.config['SHOWS_PAGE_SIZE'] = 60
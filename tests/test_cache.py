@@ -0,0 +1,117 @@
+import threading
+import pytest
+from sqlalchemy import func, select
+from benchmarks.datagen import seed
+from benchmarks.views import _artist_form, _venue_form
+from cache import page_cache, venue_key, artist_key, invalidate_venue, invalidate_artist
+from jobs import work
+from models import db, Artist, Job, Show, Venue
+
+
+class FakeRedis:
+    # redis-py's get/set/delete over a dict, ignoring expiry
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture(params=['lru', 'redis'])
+def cached_app(request, app):
+    saved = {name: app.config.get(name) for name in ('CACHE_BACKEND', 'CACHE_REDIS_CLIENT')}
+    app.config.update(CACHE_BACKEND=request.param, CACHE_REDIS_CLIENT=FakeRedis())
+    page_cache.init_app(app)
+    page_cache.hits = page_cache.misses = 0
+    seed(10, 10, 60)
+    yield app
+    app.config.update(saved)
+    page_cache.init_app(app)
+
+
+def cached(key):
+    return page_cache.backend.get(key) is not None
+
+
+def related(column, key_column, id):
+    return db.session.scalars(select(column).where(key_column == id).distinct()).all()
+
+
+def test_detail_pages_are_read_through(cached_app, client):
+    for path in ('/venues/1', '/venues/1', '/artists/1', '/artists/1'):
+        assert client.get(path).status_code == 200
+    assert page_cache.stats() == {"hits": 2, "misses": 2}
+    assert cached(venue_key(1)) and cached(artist_key(1))
+
+
+def test_redis_backend_uses_the_configured_client(cached_app, client):
+    client.get('/venues/1')
+    if cached_app.config['CACHE_BACKEND'] == 'redis':
+        assert 'fyyur:' + venue_key(1) in cached_app.config['CACHE_REDIS_CLIENT'].data
+
+
+def test_invalidate_venue_drops_the_pages_it_appears_on(cached_app, client):
+    artist_ids = related(Show.artist_id, Show.venue_id, 1)
+    others = set(range(1, 11)) - set(artist_ids)
+    assert artist_ids and others
+    for path in ['/venues/1'] + ['/artists/{}'.format(id) for id in range(1, 11)]:
+        client.get(path)
+    invalidate_venue(1)
+    assert not cached(venue_key(1))
+    assert not any(cached(artist_key(id)) for id in artist_ids)
+    assert all(cached(artist_key(id)) for id in others)
+
+
+def test_invalidate_artist_drops_the_pages_it_appears_on(cached_app, client):
+    venue_ids = related(Show.venue_id, Show.artist_id, 1)
+    assert venue_ids
+    for path in ['/artists/1'] + ['/venues/{}'.format(id) for id in venue_ids]:
+        client.get(path)
+    invalidate_artist(1)
+    assert not cached(artist_key(1))
+    assert not any(cached(venue_key(id)) for id in venue_ids)
+
+
+def warm(client, paths):
+    for path in paths:
+        client.get(path)
+
+
+def test_edits_drop_the_pages_they_appear_on(cached_app, client):
+    # inline with an in-process backend; by `flask jobs work` with a shared one
+    venue, artist = db.session.get(Venue, 1), db.session.get(Artist, 1)
+    artist_ids = related(Show.artist_id, Show.venue_id, 1)
+    venue_ids = related(Show.venue_id, Show.artist_id, 1)
+    warm(client, ['/venues/{}'.format(id) for id in venue_ids + [1]]
+         + ['/artists/{}'.format(id) for id in artist_ids + [1]])
+    client.post('/venues/1/edit', data=_venue_form(venue))
+    client.post('/artists/1/edit', data=_artist_form(artist))
+    assert not cached(venue_key(1)) and not cached(artist_key(1))
+    queued = db.session.scalar(select(func.count(Job.id)))
+    pages = [venue_key(id) for id in venue_ids] + [artist_key(id) for id in artist_ids]
+    if cached_app.config['CACHE_BACKEND'] == 'redis':
+        assert queued == 2
+        assert any(cached(key) for key in pages)
+        work(threading.Event(), burst=True)
+    else:
+        assert queued == 0
+    assert not any(cached(key) for key in pages)
+
+
+def test_deleting_a_venue_drops_the_pages_it_appeared_on(cached_app, client):
+    artist_ids = related(Show.artist_id, Show.venue_id, 1)
+    pages = [venue_key(1)] + [artist_key(id) for id in artist_ids]
+    warm(client, ['/venues/1'] + ['/artists/{}'.format(id) for id in artist_ids])
+    assert all(cached(key) for key in pages)
+    client.post('/venues/1/delete')
+    assert db.session.get(Venue, 1) is None
+    assert not any(cached(key) for key in pages)
+    for id in artist_ids:
+        assert 'href="/venues/1"' not in client.get('/artists/{}'.format(id)).get_data(as_text=True)
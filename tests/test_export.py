@@ -0,0 +1,41 @@
+import io
+import sys
+import pytest
+from benchmarks.datagen import seed
+
+
+@pytest.fixture
+def without_pyarrow(monkeypatch):
+    # a None entry makes `import pyarrow` raise ImportError
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow.parquet', None)
+
+
+@pytest.mark.parametrize('entity', ['venues', 'artists', 'shows'])
+@pytest.mark.parametrize('format', ['csv', 'jsonl'])
+def test_export_streams(app, client, entity, format):
+    seed(5, 5, 10)
+    response = client.get('/export/{}.{}'.format(entity, format))
+    assert response.status_code == 200
+    assert response.get_data()
+
+
+def test_parquet_without_pyarrow_is_not_implemented(app, client, without_pyarrow):
+    seed(5, 5, 10)
+    response = client.get('/export/shows.parquet')
+    assert response.status_code == 501
+    assert b'pyarrow' in response.get_data()
+
+
+def test_parquet_export_command_without_pyarrow_fails_cleanly(app, without_pyarrow):
+    result = app.test_cli_runner().invoke(args=['export', 'shows', 'parquet'])
+    assert result.exit_code == 1
+    assert 'needs the pyarrow package' in result.output
+
+
+def test_parquet_export(app, client):
+    pq = pytest.importorskip('pyarrow.parquet')
+    seed(5, 5, 10)
+    response = client.get('/export/shows.parquet')
+    assert response.status_code == 200
+    assert pq.read_table(io.BytesIO(response.get_data())).num_rows == 10
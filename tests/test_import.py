@@ -0,0 +1,53 @@
+import csv
+import json
+from benchmarks.datagen import GENRES, seed
+from models import db, Venue
+
+VENUE = {
+    "name": "Imported Venue", "city": "San Francisco", "state": "CA", "address": "1 Main Street",
+    "phone": "555-555-0000", "facebook_link": "https://www.facebook.com/imported", "genres": GENRES[:2],
+}
+
+
+def run_import(app, entity, path, *args):
+    return app.test_cli_runner().invoke(args=['import', entity, str(path)] + list(args))
+
+
+def test_rejects_say_which_field_failed_and_why(app, tmp_path):
+    seed(1, 0, 0)
+    rows = [
+        {"name": "No City"},
+        dict(VENUE, id=1),
+        dict(VENUE, name="New Venue"),
+    ]
+    source = tmp_path / 'venues.jsonl'
+    source.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+    rejects = tmp_path / 'rejects.csv'
+    result = run_import(app, 'venues', source, '--batch-size', '1', '--rejects', str(rejects))
+    assert '3 read, 1 inserted, 2 rejected' in result.output
+
+    with open(rejects, newline='') as f:
+        rejected = list(csv.DictReader(f))
+    # the first reject has no phone, but the header still has every field
+    assert [row["name"] for row in rejected] == ['No City', 'Imported Venue']
+    assert rejected[1]["phone"] == VENUE["phone"]
+    assert 'city: ' in rejected[0]["error"]
+    assert rejected[1]["error"].startswith('database: ')
+    assert 'UNIQUE' in rejected[1]["error"]
+    assert db.session.query(Venue).filter_by(name='New Venue').count() == 1
+
+
+def test_csv_rejects_keep_the_input_columns(app, tmp_path):
+    seed(0, 0, 0)
+    source = tmp_path / 'venues.csv'
+    with open(source, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(VENUE) + ['notes'])
+        writer.writeheader()
+        writer.writerow(dict(VENUE, state='', genres=';'.join(VENUE["genres"]), notes='kept'))
+    result = run_import(app, 'venues', source)
+    assert '1 rejected' in result.output
+    with open(tmp_path / 'venues.rejects.csv', newline='') as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == list(VENUE) + ['notes', 'error']
+        rejected = next(reader)
+    assert rejected["notes"] == 'kept' and 'state: ' in rejected["error"]
@@ -0,0 +1,95 @@
+import atexit
+import json
+import logging
+import pytest
+from flask import Flask, Response, stream_with_context
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from models import db
+from logs import LogPipeline
+from metrics import Metrics
+from profiler import QueryProfiler
+from sqltimer import query_timer
+
+# An app of its own, so the instrumentation can be set up with settings the
+# shared test app was not imported with.
+
+
+@pytest.fixture
+def instrumented(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'instrumented.db'),
+        PROFILER_ENABLED=True,
+        PROFILER_N_PLUS_ONE_THRESHOLD=3,
+    )
+    db.init_app(app)
+    profiler = QueryProfiler(app)
+    app.metrics = Metrics(app)
+
+    @app.route('/queries/<int:count>')
+    def queries(count):
+        for i in range(count):
+            db.session.execute(text('SELECT :i'), {"i": i})
+        return 'ok'
+
+    @app.route('/stream')
+    def stream():
+        def rows():
+            for i in range(3):
+                yield str(db.session.execute(text('SELECT :i'), {"i": i}).scalar())
+        return Response(stream_with_context(rows()))
+
+    app.profiler = profiler
+    yield app
+    atexit.unregister(profiler.dump)
+
+
+def test_profiler_counts_each_statement_once(instrumented):
+    response = instrumented.test_client().get('/queries/4')
+    assert response.headers['X-Query-Count'] == '4'
+    assert response.headers['X-Query-Duplicates'] == '3'
+    assert response.headers['X-Query-N-Plus-One'] == '1'
+    assert instrumented.profiler.summary()["queries"]["max_queries"] == 4
+
+
+def test_streamed_responses_get_no_query_headers(instrumented):
+    response = instrumented.test_client().get('/stream')
+    assert response.get_data(as_text=True) == '012'
+    assert 'X-Query-Count' not in response.headers
+    assert 'stream' not in instrumented.profiler.summary()
+
+
+def test_statements_are_timed_by_the_shared_listener(instrumented):
+    assert instrumented.extensions['query_timer'] is query_timer
+    assert event.contains(Engine, 'before_cursor_execute', query_timer._before_execute)
+    assert event.contains(Engine, 'after_cursor_execute', query_timer._after_execute)
+    # the profiler, metrics and logs add none of their own
+    with instrumented.app_context():
+        assert len(list(db.engine.dispatch.before_cursor_execute)) == 1
+        assert len(list(db.engine.dispatch.after_cursor_execute)) == 1
+
+
+def test_metrics_count_the_timed_statements(instrumented):
+    client = instrumented.test_client()
+    client.get('/queries/4')
+    client.get('/queries/2')
+    counters, histograms = instrumented.metrics.registry.collect()
+    assert counters[('fyyur_db_queries_total', (('endpoint', 'queries'),))] == 6
+    assert sum(histograms[('fyyur_request_db_seconds', (('endpoint', 'queries'),))][:-1]) == 2
+
+
+def test_access_log_counts_the_timed_statements(instrumented, tmp_path):
+    instrumented.config['LOG_FILE'] = str(tmp_path / 'access.log')
+    pipeline = LogPipeline(instrumented)
+    root = logging.getLogger()
+    handler = root.handlers[-1]
+    try:
+        instrumented.test_client().get('/queries/3')
+    finally:
+        pipeline.close()
+        root.removeHandler(handler)
+        atexit.unregister(pipeline.close)
+    records = [json.loads(line) for line in open(tmp_path / 'access.log')]
+    access = [record for record in records if record["logger"] == 'fyyur.access']
+    assert access[-1]["db_queries"] == 3
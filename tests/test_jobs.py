@@ -0,0 +1,134 @@
+import threading
+from datetime import timedelta
+import pytest
+from sqlalchemy import func, select, update
+from benchmarks.datagen import seed
+from jobs import backoff, claim, enqueue, job, work
+from models import db, Job, Venue, utcnow
+
+ran = []
+
+
+@job('tests.record')
+def record(value):
+    ran.append(value)
+
+
+@job('tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('always fails')
+
+
+@pytest.fixture
+def jobs_app(app):
+    ran.clear()
+    yield app
+    ran.clear()
+
+
+def jobs():
+    return db.session.scalars(select(Job).order_by(Job.id)).all()
+
+
+def make_due():
+    db.session.execute(update(Job).values(run_at=utcnow()))
+    db.session.commit()
+
+
+def test_job_runs_and_is_removed(jobs_app):
+    enqueue(record, value=1)
+    db.session.commit()
+    assert work(threading.Event(), burst=True) == 1
+    assert ran == [1]
+    assert jobs() == []
+
+
+def test_enqueue_rolls_back_with_the_handler(jobs_app):
+    seed(1, 1, 0)
+    db.session.get(Venue, 1).name = 'Renamed'
+    enqueue(record, value=1)
+    db.session.rollback()
+    assert db.session.get(Venue, 1).name != 'Renamed'
+    assert jobs() == []
+    assert work(threading.Event(), burst=True) == 0
+
+
+def test_delayed_job_waits(jobs_app):
+    enqueue(record, delay=60, value=1)
+    db.session.commit()
+    assert work(threading.Event(), burst=True) == 0
+    make_due()
+    assert work(threading.Event(), burst=True) == 1
+
+
+def test_claim_leases_jobs(jobs_app):
+    first, second = enqueue(record, value=1), enqueue(record, value=2)
+    db.session.commit()
+    first_id, second_id = first.id, second.id
+    assert [row[0] for row in claim('a')] == [first_id]
+    assert [row[0] for row in claim('b', limit=5)] == [second_id]
+    assert claim('c') == []
+    # the lease on the first job runs out, so it is claimed again
+    db.session.execute(update(Job).where(Job.id == first_id).values(locked_until=utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    assert claim('c', limit=5) == [(first_id, 'tests.record', {"value": 1}, 2, 5)]
+
+
+def test_backoff_doubles_up_to_the_cap(jobs_app):
+    saved = {name: jobs_app.config[name] for name in ('JOBS_RETRY_BACKOFF', 'JOBS_RETRY_BACKOFF_MAX')}
+    jobs_app.config.update(JOBS_RETRY_BACKOFF=10, JOBS_RETRY_BACKOFF_MAX=60)
+    try:
+        for attempts, delay in ((1, 10), (2, 20), (3, 40), (4, 60), (10, 60)):
+            for _ in range(20):
+                assert timedelta(seconds=delay / 2) <= backoff(attempts) <= timedelta(seconds=delay)
+    finally:
+        jobs_app.config.update(saved)
+
+
+def test_failed_job_is_retried_later(jobs_app):
+    enqueue(fail)
+    db.session.commit()
+    assert work(threading.Event(), burst=True) == 1
+    [failed] = jobs()
+    assert failed.status == 'queued'
+    assert failed.attempts == 1
+    assert failed.locked_by is None and failed.locked_until is None
+    assert failed.run_at > utcnow()
+    assert 'always fails' in failed.last_error
+    # not due again yet
+    assert work(threading.Event(), burst=True) == 0
+
+
+def test_job_fails_after_max_attempts(jobs_app):
+    enqueue(fail)
+    db.session.commit()
+    for _ in range(2):
+        make_due()
+        assert work(threading.Event(), burst=True) == 1
+    [failed] = jobs()
+    assert failed.status == 'failed'
+    assert failed.attempts == 2
+    make_due()
+    assert work(threading.Event(), burst=True) == 0
+
+
+def test_expired_lease_on_the_last_attempt_fails(jobs_app):
+    enqueue(record, value=1)
+    db.session.commit()
+    db.session.execute(update(Job).values(attempts=5))
+    db.session.commit()
+    assert work(threading.Event(), burst=True) == 1
+    assert ran == []
+    assert jobs()[0].status == 'failed'
+
+
+def test_unique_jobs_coalesce_while_waiting(jobs_app):
+    assert enqueue(record, unique=True, value=1) is not None
+    assert enqueue(record, unique=True, value=2) is None
+    db.session.commit()
+    assert enqueue(record, unique=True, value=3) is None
+    # once claimed, a new run may be queued for changes made since
+    claim('a')
+    assert enqueue(record, unique=True, value=4) is not None
+    db.session.commit()
+    assert db.session.scalar(select(func.count(Job.id))) == 2
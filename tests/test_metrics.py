@@ -0,0 +1,34 @@
+import threading
+from metrics import Registry
+
+
+def record(registry, count):
+    for _ in range(count):
+        registry.inc('fyyur_requests_total', ())
+        registry.observe('fyyur_request_duration_seconds', (), 0.02)
+
+
+def test_exited_threads_leave_no_shards():
+    registry = Registry()
+    for _ in range(50):
+        threads = [threading.Thread(target=record, args=(registry, 2)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(registry._shards) == 0
+    counters, histograms = registry.collect()
+    assert counters[('fyyur_requests_total', ())] == 1000
+    observations = histograms[('fyyur_request_duration_seconds', ())]
+    assert sum(observations[:-1]) == 1000
+
+
+def test_live_threads_are_counted():
+    registry = Registry()
+    record(registry, 3)
+    thread = threading.Thread(target=record, args=(registry, 2))
+    thread.start()
+    thread.join()
+    assert len(registry._shards) == 1
+    counters, _ = registry.collect()
+    assert counters[('fyyur_requests_total', ())] == 5
@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine, text
+from metrics import pool_gauges
+from pool import TimedQueuePool, engine_options, pool_stats
+
+
+def test_each_pool_counts_its_own_checkouts(tmp_path):
+    engines = {}
+    for bind, name in ((None, 'primary.db'), ('replica_0', 'replica.db')):
+        url = 'sqlite:///{}'.format(tmp_path / name)
+        engines[bind] = create_engine(url, **engine_options({}, url))
+    assert isinstance(engines[None].pool, TimedQueuePool)
+    for _ in range(3):
+        with engines[None].connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+    stats = pool_stats(engines)
+    assert stats["primary"]["checkouts"] == 3
+    assert stats["replica_0"]["checkouts"] == 0
+    gauges = pool_gauges(engines)
+    assert gauges[('fyyur_db_pool_checkouts_total', (('bind', 'primary'),))] == 3
+    assert gauges[('fyyur_db_pool_checkouts_total', (('bind', 'replica_0'),))] == 0
+    for engine in engines.values():
+        engine.dispose()
+
+
+def test_pool_stats_are_keyed_by_bind(app, client):
+    client.get('/venues')
+    stats = client.get('/pool/stats').json
+    assert stats["primary"]["checkouts"] >= 1
@@ -0,0 +1,106 @@
+import time
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import insert, select
+from models import db, configure_replicas, read_only, Venue, PRIMARY_COOKIE
+import aio
+
+# An app with a primary and a replica SQLite file holding different venues,
+# so each response shows which database it was read from.
+
+
+@pytest.fixture
+def routed(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'primary.db'),
+        SQLALCHEMY_REPLICA_URIS=['sqlite:///{}'.format(tmp_path / 'replica.db')],
+        REPLICA_LAG_WINDOW=5,
+    )
+    configure_replicas(app)
+    db.init_app(app)
+
+    def names():
+        return jsonify(db.session.scalars(select(Venue.name).order_by(Venue.name)).all())
+
+    @app.route('/replicated')
+    @read_only
+    def replicated():
+        return names()
+
+    @app.route('/primary')
+    def primary():
+        return names()
+
+    @app.route('/venues', methods=['POST'])
+    @read_only
+    def create_venue():
+        db.session.add(Venue(name='Created'))
+        db.session.commit()
+        return names()
+
+    with app.app_context():
+        for engine, name in ((db.engines[None], 'Primary'), (db.engines['replica_0'], 'Replica')):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(insert(Venue).values(name=name))
+    # each request gets an app context and so a session of its own
+    yield app
+    # init_app registered the replica bind on the shared db; the other tests'
+    # app has no such bind
+    db.metadatas.pop('replica_0', None)
+
+
+def test_read_only_views_read_the_replica(routed):
+    assert routed.test_client().get('/replicated').json == ['Replica']
+
+
+def test_other_views_read_the_primary(routed):
+    assert routed.test_client().get('/primary').json == ['Primary']
+
+
+def test_writes_go_to_the_primary(routed):
+    client = routed.test_client()
+    assert client.post('/venues').json == ['Created', 'Primary']
+    with routed.app_context(), db.engines['replica_0'].connect() as connection:
+        assert connection.scalars(select(Venue.name)).all() == ['Replica']
+
+
+def test_reads_after_a_write_stay_on_the_primary(routed):
+    client = routed.test_client()
+    client.post('/venues')
+    assert client.get('/replicated').json == ['Created', 'Primary']
+    # other clients are not held back
+    assert routed.test_client().get('/replicated').json == ['Replica']
+
+
+def test_reads_go_back_to_the_replica_after_the_lag_window(routed):
+    client = routed.test_client()
+    client.post('/venues')
+    client.set_cookie(PRIMARY_COOKIE, repr(time.time() - 1))
+    assert client.get('/replicated').json == ['Replica']
+
+
+def test_async_reads_are_routed_the_same_way(routed):
+    primary, replica = object(), object()
+    with routed.test_request_context():
+        assert aio.request_engines(primary, [replica]) == (replica, primary)
+        assert aio.request_engines(primary, []) == (primary, primary)
+    cookie = '{}={}'.format(PRIMARY_COOKIE, time.time() + 5)
+    with routed.test_request_context(headers={"Cookie": cookie}):
+        assert aio.request_engines(primary, [replica]) == (primary, primary)
+
+
+def test_the_window_holds_across_secret_keys(routed):
+    # e.g. worker processes started without a shared SECRET_KEY
+    client = routed.test_client()
+    client.post('/venues')
+    routed.secret_key = 'another'
+    assert client.get('/replicated').json == ['Created', 'Primary']
+
+
+def test_read_only_pages_do_not_vary_on_cookies(app, client):
+    response = client.get('/venues')
+    assert 'Cookie' not in response.headers.get('Vary', '')
+    assert response.headers['Cache-Control'].startswith('public')
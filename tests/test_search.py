@@ -0,0 +1,90 @@
+import importlib.util
+import os
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from benchmarks.datagen import seed
+from conftest import ROOT
+from models import db, Venue
+from search import search
+
+# The tests build the schema with create_all, so the FTS5 tables and their
+# triggers are made by running migration 9fc319baee50 itself.
+NAME_SEARCH_MIGRATION = os.path.join(ROOT, 'migrations', 'versions', '9fc319baee50_name_search_indexes.py')
+
+
+def run_migration(path, step):
+    spec = importlib.util.spec_from_file_location('migration', path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with db.engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            getattr(migration, step)()
+
+
+@pytest.fixture
+def search_app(app):
+    app.config['SEARCH_BACKEND'] = 'like'
+    seed(30, 30, 0)
+    yield app
+    app.config['SEARCH_BACKEND'] = 'auto'
+
+
+@pytest.fixture
+def fts_app(app):
+    run_migration(NAME_SEARCH_MIGRATION, 'upgrade')
+    app.config['SEARCH_BACKEND'] = 'fts5'
+    yield app
+    app.config['SEARCH_BACKEND'] = 'auto'
+    db.session.remove()
+    run_migration(NAME_SEARCH_MIGRATION, 'downgrade')
+
+
+def names(term, **kwargs):
+    return [row["name"] for row in search(Venue, term, **kwargs)["data"]]
+
+
+@pytest.mark.parametrize('path', ['/venues/search', '/artists/search'])
+@pytest.mark.parametrize('after', ['bad', '1.5', 'x:1', '0.5:y'])
+def test_malformed_cursor_is_a_bad_request(search_app, client, path, after):
+    response = client.post(path, data={"search_term": "e", "after": after})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/venues/search', '/artists/search'])
+def test_well_formed_cursor_is_accepted(search_app, client, path):
+    assert client.post(path, data={"search_term": "e", "after": "1.0:3"}).status_code == 200
+
+
+def test_fts_index_follows_inserts_renames_and_deletes(fts_app):
+    venue = Venue(name='The Blue Moon Hall')
+    db.session.add(venue)
+    db.session.commit()
+    assert names('moon') == ['The Blue Moon Hall']
+    assert names('MOON H') == ['The Blue Moon Hall']
+
+    venue.name = 'The Red Sun Hall'
+    db.session.commit()
+    assert names('moon') == []
+    assert names('sun') == ['The Red Sun Hall']
+
+    db.session.delete(venue)
+    db.session.commit()
+    assert names('sun') == []
+
+
+def test_fts_cursor_pages_through_every_match(fts_app, client):
+    db.session.add_all([Venue(name='Hall {}'.format(i)) for i in range(12)] + [Venue(name='Arena')])
+    db.session.commit()
+    seen, after = [], None
+    while True:
+        page = search(Venue, 'hall', limit=5, after=after)
+        assert page["count"] == 12
+        seen.extend(row["name"] for row in page["data"])
+        after = page["next"]
+        if after is None:
+            break
+    assert sorted(seen) == sorted('Hall {}'.format(i) for i in range(12))
+    # the search form reads the same index
+    response = client.post('/venues/search', data={"search_term": "hall"})
+    assert response.status_code == 200 and 'Hall 0' in response.get_data(as_text=True)
@@ -0,0 +1,141 @@
+import re
+import random
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from flask import message_flashed
+from benchmarks.datagen import seed
+from conftest import DATABASE
+from models import db, Show
+from scheduling import BatchChecker, IntervalTree, free_slots, lock_schedule
+from test_asgi import asgi_get
+
+BAD_CURSORS = ['bad', '2020-01-01_x', 'x_1', '_']
+
+
+@pytest.mark.parametrize('after', BAD_CURSORS)
+def test_malformed_cursor_is_a_bad_request(app, client, after):
+    seed(5, 5, 20)
+    assert client.get('/shows', query_string={"after": after}).status_code == 400
+
+
+@pytest.mark.parametrize('after', BAD_CURSORS)
+def test_malformed_cursor_is_a_bad_request_under_asgi(app, after):
+    seed(5, 5, 20)
+    assert asgi_get('/shows?after=' + after).status_code == 400
+
+
+def test_next_page_link_is_followed(app, client):
+    seed(5, 5, 20)
+    app.config['SHOWS_PAGE_SIZE'] = 5
+    try:
+        page = client.get('/shows').get_data(as_text=True)
+        next_url = re.search(r'href="(/shows\?[^"]*after=[^"]*)"', page).group(1).replace('&amp;', '&')
+        assert client.get(next_url).status_code == 200
+        assert asgi_get(next_url).status_code == 200
+    finally:
+        app.config['SHOWS_PAGE_SIZE'] = 60
+
+
+# scheduling
+
+DAY = datetime(2031, 5, 1)
+
+
+def book(client, venue_id, artist_id, start_time, duration=120):
+    # the messages flashed while booking
+    flashed = []
+    def record(sender, message, category, **extra):
+        flashed.append(message)
+    with message_flashed.connected_to(record):
+        client.post('/shows/create', data={
+            "venue_id": venue_id,
+            "artist_id": artist_id,
+            "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            "duration": duration,
+        })
+    return flashed
+
+
+def test_interval_tree_matches_a_scan():
+    rng = random.Random(0)
+    intervals = [(start, start + rng.randrange(0, 10), i)
+                 for i, start in enumerate(rng.randrange(0, 100) for _ in range(200))]
+    tree = IntervalTree(intervals)
+    for _ in range(100):
+        start = rng.randrange(0, 110)
+        end = start + rng.randrange(0, 15)
+        # half open, and empty intervals overlap nothing
+        expected = {i for s, e, i in intervals if s < end and start < e and s < e and start < end}
+        assert {i for _, _, i in tree.overlapping(start, end)} == expected
+
+
+def test_venue_clash_is_refused(app, client):
+    seed(2, 2, 0)
+    assert book(client, 1, 1, DAY.replace(hour=20)) == ['Show was successfully listed!']
+    assert book(client, 1, 2, DAY.replace(hour=21))[0].startswith('Venue is already booked')
+    assert Show.query.count() == 1
+
+
+def test_artist_clash_is_refused(app, client):
+    seed(2, 2, 0)
+    assert book(client, 1, 1, DAY.replace(hour=20)) == ['Show was successfully listed!']
+    assert book(client, 2, 1, DAY.replace(hour=19))[0].startswith('Artist is already booked')
+    assert Show.query.count() == 1
+
+
+def test_back_to_back_shows_do_not_clash(app, client):
+    seed(2, 2, 0)
+    assert book(client, 1, 1, DAY.replace(hour=18)) == ['Show was successfully listed!']
+    assert book(client, 1, 2, DAY.replace(hour=20)) == ['Show was successfully listed!']
+    assert book(client, 2, 1, DAY.replace(hour=16)) == ['Show was successfully listed!']
+    assert Show.query.count() == 3
+
+
+def test_free_slots_over_a_booked_day(app):
+    seed(2, 2, 0)
+    hour = timedelta(hours=1)
+    for venue_id, artist_id, start, end in [(1, 1, 10, 12), (1, 2, 14, 16), (1, 1, 16, 17)]:
+        db.session.add(Show(venue_id=venue_id, artist_id=artist_id,
+                            start_time=DAY + start * hour, end_time=DAY + end * hour))
+    # ends inside the day, so only its tail blocks the morning
+    db.session.add(Show(venue_id=2, artist_id=2, start_time=DAY - 2 * hour, end_time=DAY + 3 * hour))
+    db.session.commit()
+    slots = free_slots([1, 2], DAY, DAY + 24 * hour, min_length=2 * hour)
+    assert slots[1] == [(DAY, DAY + 10 * hour), (DAY + 12 * hour, DAY + 14 * hour), (DAY + 17 * hour, DAY + 24 * hour)]
+    assert slots[2] == [(DAY + 3 * hour, DAY + 24 * hour)]
+
+
+def test_batch_clashing_with_itself(app):
+    seed(3, 3, 0)
+    hour = timedelta(hours=1)
+    db.session.add(Show(venue_id=3, artist_id=3, start_time=DAY, end_time=DAY + 2 * hour))
+    db.session.commit()
+    batch = [
+        dict(venue_id=1, artist_id=1, start_time=DAY, end_time=DAY + 2 * hour),
+        dict(venue_id=1, artist_id=2, start_time=DAY + hour, end_time=DAY + 3 * hour),
+        dict(venue_id=2, artist_id=1, start_time=DAY + hour, end_time=DAY + 3 * hour),
+        dict(venue_id=1, artist_id=2, start_time=DAY + 2 * hour, end_time=DAY + 4 * hour),
+        dict(venue_id=3, artist_id=2, start_time=DAY + hour, end_time=DAY + 2 * hour),
+    ]
+    checker = BatchChecker(batch)
+    errors = [checker.check(show) for show in batch]
+    assert errors[0] is None
+    assert errors[1].startswith('venue: already booked')
+    assert errors[2].startswith('artist: already booked')
+    assert errors[3] is None
+    assert errors[4] == 'venue: already booked {} - {} (show 1)'.format(DAY, DAY + 2 * hour)
+
+
+def test_booking_holds_the_sqlite_write_lock(app):
+    seed(1, 1, 0)
+    lock_schedule()
+    other = sqlite3.connect(DATABASE, timeout=0)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute('UPDATE "Venue" SET name = name')
+        db.session.rollback()
+        other.execute('UPDATE "Venue" SET name = name')
+        other.commit()
+    finally:
+        other.close()
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from benchmarks.datagen import seed
+from models import db, Artist, Show, read_model_refreshes, utcnow
+from upcoming import NAME, is_fresh, refresh, use_read_model
+
+
+def add_show(artist_id, start_time):
+    db.session.add(Show(venue_id=1, artist_id=artist_id, start_time=start_time))
+    db.session.commit()
+
+
+def upcoming_page(client):
+    response = client.get('/shows', query_string={"upcoming": 1})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def age_refresh(by):
+    db.session.execute(
+        update(read_model_refreshes).where(read_model_refreshes.c.name == NAME)
+        .values(refreshed_at=utcnow() - by)
+    )
+    db.session.commit()
+
+
+def setup_artists():
+    seed(1, 3, 0)
+    for id, name in ((1, 'Early Booking'), (2, 'Late Booking'), (3, 'Past Booking')):
+        db.session.get(Artist, id).name = name
+    db.session.commit()
+
+
+def test_refresh_keeps_upcoming_shows_only(app):
+    setup_artists()
+    now = datetime.now()
+    add_show(1, now + timedelta(days=1))
+    add_show(3, now - timedelta(days=1))
+    assert refresh() == 1
+    # shows that have started by then are left out
+    assert refresh(current_time=now + timedelta(days=2)) == 0
+
+
+def test_is_fresh(app):
+    assert not is_fresh(None)
+    assert is_fresh(utcnow())
+    assert not is_fresh(utcnow() - timedelta(seconds=61), max_staleness=60)
+    assert not use_read_model({"upcoming": True})
+    refresh()
+    assert use_read_model({"upcoming": True})
+    assert not use_read_model({"upcoming": False})
+
+
+def test_stale_read_model_falls_back_to_the_live_query(app, client):
+    setup_artists()
+    add_show(1, datetime.now() + timedelta(days=1))
+    # never refreshed
+    assert 'Early Booking' in upcoming_page(client)
+    refresh()
+    add_show(2, datetime.now() + timedelta(days=2))
+    age_refresh(timedelta(hours=1))
+    page = upcoming_page(client)
+    assert 'Early Booking' in page and 'Late Booking' in page
+
+
+def test_fresh_read_model_is_served(app, client):
+    setup_artists()
+    add_show(1, datetime.now() + timedelta(days=1))
+    refresh()
+    # listed after the refresh, so only the live query has it
+    add_show(2, datetime.now() + timedelta(days=2))
+    page = upcoming_page(client)
+    assert 'Early Booking' in page and 'Late Booking' not in page
+    assert 'Late Booking' in client.get('/shows').get_data(as_text=True)
+    refresh()
+    assert 'Late Booking' in upcoming_page(client)
+
+
+def test_refresh_changes_the_etag(app, client):
+    setup_artists()
+    add_show(1, datetime.now() + timedelta(days=1))
+    refresh()
+    etag = client.get('/shows', query_string={"upcoming": 1}).headers['ETag']
+    assert client.get('/shows', query_string={"upcoming": 1}, headers={"If-None-Match": etag}).status_code == 304
+    age_refresh(timedelta(seconds=10))
+    assert client.get('/shows', query_string={"upcoming": 1}, headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,39 @@
+from sqlalchemy import event
+from benchmarks.datagen import seed
+from models import db
+
+
+def count_statements(client, path):
+    statements = []
+    def count(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def reseed(venues, artists, shows):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    seed(venues, artists, shows)
+    db.session.remove()
+
+
+def test_venues_statement_count_does_not_grow_with_data(client):
+    reseed(20, 20, 100)
+    small = count_statements(client, '/venues')
+    reseed(200, 200, 1000)
+    large = count_statements(client, '/venues')
+    assert large == small
+
+
+def test_venues_lists_every_venue_once(client):
+    reseed(30, 10, 50)
+    page = client.get('/venues').get_data(as_text=True)
+    for id in range(1, 31):
+        assert page.count('href="/venues/{}"'.format(id)) == 1
@@ -0,0 +1,96 @@
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select, text, update
+from jobs import job
+from models import db, Venue, Artist, Show, upcoming_show_view, read_model_refreshes, utcnow
+#----------------------------------------------------------------------------#
+# Upcoming shows read model.
+#----------------------------------------------------------------------------#
+
+# UpcomingShow holds every show that had not started when it was last
+# refreshed, joined to its venue and artist. Refresh it periodically with
+#
+#   flask upcoming refresh --every 60
+#
+# (or from cron without --every). /shows?upcoming=1 reads from it while the
+# last refresh is at most UPCOMING_SHOWS_MAX_STALENESS seconds old, filtering
+# out shows that have started since, and falls back to the live tables
+# otherwise. Shows listed after the refresh appear at the next one.
+
+NAME = 'upcoming_shows'
+
+def upcoming_show_select(current_time):
+    return select(
+        Show.id, Show.start_time, Show.end_time,
+        Show.venue_id, Venue.name, Venue.image_link,
+        Show.artist_id, Artist.name, Artist.image_link,
+        Show.updated_at, Venue.updated_at, Artist.updated_at,
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .where(Show.start_time > current_time)
+
+def is_materialized_view():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.scalar(text(
+        "SELECT count(*) FROM pg_matviews WHERE matviewname = 'UpcomingShow'"
+    )) > 0
+
+@job('upcoming.refresh')
+def refresh(current_time=None):
+    # Rebuilds UpcomingShow in one transaction; readers keep seeing the
+    # previous contents until it commits. Returns the number of rows.
+    if current_time is None:
+        current_time = datetime.now()
+    if is_materialized_view():
+        # CONCURRENTLY diffs against the unique index on id instead of
+        # locking readers out
+        db.session.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY "UpcomingShow"'))
+    else:
+        db.session.execute(delete(upcoming_show_view))
+        db.session.execute(insert(upcoming_show_view).from_select(
+            [column.name for column in upcoming_show_view.columns], upcoming_show_select(current_time)
+        ))
+    refreshed = {"name": NAME, "refreshed_at": utcnow()}
+    if db.session.execute(
+        update(read_model_refreshes).where(read_model_refreshes.c.name == NAME).values(refreshed)
+    ).rowcount == 0:
+        db.session.execute(insert(read_model_refreshes).values(refreshed))
+    db.session.commit()
+    return db.session.scalar(select(db.func.count()).select_from(upcoming_show_view))
+
+def refreshed_at_select():
+    return select(read_model_refreshes.c.refreshed_at).where(read_model_refreshes.c.name == NAME)
+
+def is_fresh(refreshed_at, max_staleness=None):
+    # Whether a refresh at refreshed_at is recent enough to read from.
+    if max_staleness is None:
+        max_staleness = current_app.config.get('UPCOMING_SHOWS_MAX_STALENESS', 60)
+    return refreshed_at is not None and utcnow() - refreshed_at <= timedelta(seconds=max_staleness)
+
+def use_read_model(filters):
+    # Whether show_query can read the /shows filters from UpcomingShow.
+    return bool(filters.get('upcoming')) and is_fresh(db.session.scalar(refreshed_at_select()))
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+upcoming_cli = AppGroup('upcoming', help='Maintain the upcoming shows read model.')
+
+@upcoming_cli.command('refresh')
+@click.option('--every', type=float, help='Keep refreshing, every this many seconds.')
+def refresh_command(every):
+    """Rebuild the upcoming shows read model from the Show table."""
+    while True:
+        start = time.perf_counter()
+        count = refresh()
+        elapsed = time.perf_counter() - start
+        click.echo('{} upcoming shows in {:.2f}s'.format(count, elapsed))
+        if not every:
+            return
+        db.session.remove()
+        time.sleep(max(0, every - elapsed))